@@ -1,9 +1,17 @@
+import asyncio
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
-from app.utils.security import verify_password, create_access_token, create_refresh_token, verify_token
+from app.utils.security import (
+    check_password,
+    get_password_hash,
+    verify_dummy_password,
+    create_access_token,
+    create_refresh_token,
+    verify_token_cached
+)
 from app.utils.supabase_client import db_manager
 from app.config import settings
 import logging
@@ -11,6 +19,36 @@ import logging
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
+# Auth error payloads shared by every rejection; each raise builds its own
+# exception, since raising mutates __traceback__ and __context__
+_CREDENTIALS_DETAIL = "Could not validate credentials"
+_CREDENTIALS_HEADERS = {"WWW-Authenticate": "Bearer"}
+_FORBIDDEN_DETAIL = "Not enough permissions"
+
+
+def _credentials_error() -> HTTPException:
+    """401 asking for a valid bearer token"""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=_CREDENTIALS_DETAIL,
+        headers=_CREDENTIALS_HEADERS,
+    )
+
+
+def _forbidden_error() -> HTTPException:
+    """403 for authenticated non-admin users"""
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=_FORBIDDEN_DETAIL)
+
+
+def _build_claims(user: Dict[str, Any]) -> Dict[str, Any]:
+    """JWT claims carried by both access and refresh tokens"""
+    return {
+        "sub": user["username"],
+        "user_id": user["id"],
+        "email": user.get("email"),
+        "is_admin": user.get("is_admin", False)
+    }
+
 
 class AuthHandler:
     """Handle authentication and authorization"""
@@ -19,34 +57,47 @@ class AuthHandler:
     async def authenticate_user(username: str, password: str) -> Optional[Dict[str, Any]]:
         """Authenticate user with username and password"""
         try:
-            user = db_manager.get_user_by_username(username)
+            user = await db_manager.aget_user_by_username(username)
             
             if not user:
                 logger.warning(f"User not found: {username}")
+                # Same bcrypt cost as a real check so response time leaks nothing
+                await asyncio.to_thread(verify_dummy_password, password)
                 return None
             
-            if not verify_password(password, user.get('password_hash', '')):
+            # bcrypt is CPU-bound, keep it off the event loop
+            valid, needs_rehash = await asyncio.to_thread(
+                check_password, password, user.get('password_hash', '')
+            )
+            if not valid:
                 logger.warning(f"Invalid password for user: {username}")
                 return None
             
+            if needs_rehash:
+                await AuthHandler._upgrade_password_hash(user, password)
+            
             if not user.get('is_active', True):
                 logger.warning(f"Inactive user attempted login: {username}")
                 return None
             
             return user
         except Exception as e:
-            logger.error(f"Error authenticating user: {e}", exc_info=True)
+            logger.error("Error authenticating user: %s", e, exc_info=settings.DEBUG)
             return None
     
+    @staticmethod
+    async def _upgrade_password_hash(user: Dict[str, Any], password: str):
+        """Store a legacy user's password in the current hash format (failures only logged)"""
+        try:
+            new_hash = await asyncio.to_thread(get_password_hash, password)
+            await asyncio.to_thread(db_manager.update_user, user['id'], {"password_hash": new_hash})
+        except Exception as e:
+            logger.warning("Password hash upgrade failed for %s: %s", user.get('username'), e)
+    
     @staticmethod
     def create_tokens(user_data: Dict[str, Any]) -> Dict[str, str]:
         """Create access and refresh tokens for user"""
-        token_data = {
-            "sub": user_data['username'],
-            "user_id": user_data['id'],
-            "email": user_data.get('email'),
-            "is_admin": user_data.get('is_admin', False)
-        }
+        token_data = _build_claims(user_data)
         
         access_token = create_access_token(token_data)
         refresh_token = create_refresh_token(token_data)
@@ -59,36 +110,41 @@ class AuthHandler:
     
     @staticmethod
     async def get_current_user(
+        request: Request,
         credentials: HTTPAuthorizationCredentials = Depends(security)
     ) -> Dict[str, Any]:
         """Get current user from token"""
-        credentials_exception = HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-        
+        # Already resolved by another dependency of this request
+        cached_user = getattr(request.state, "user", None)
+        if cached_user is not None:
+            return cached_user
+
         try:
             token = credentials.credentials
-            payload = verify_token(token)
+            payload = verify_token_cached(token)
             
             if payload is None:
-                raise credentials_exception
+                raise _credentials_error() from None
             
             username: str = payload.get("sub")
             token_type: str = payload.get("type")
             
             if username is None or token_type != "access":
-                raise credentials_exception
+                raise _credentials_error() from None
             
-            user = db_manager.get_user_by_username(username)
+            user = await db_manager.aget_user_by_username(username)
             if user is None:
-                raise credentials_exception
+                raise _credentials_error() from None
             
+            request.state.user = user
             return user
+        except HTTPException:
+            # Expected rejection (bad/expired token), not worth a traceback
+            logger.debug("Rejected credentials")
+            raise
         except Exception as e:
-            logger.error(f"Error getting current user: {e}")
-            raise credentials_exception
+            logger.error("Error getting current user: %s", e, exc_info=settings.DEBUG)
+            raise _credentials_error() from None
     
     @staticmethod
     async def get_current_admin(
@@ -96,17 +152,14 @@ class AuthHandler:
     ) -> Dict[str, Any]:
         """Verify current user is admin"""
         if not current_user.get('is_admin', False):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Not enough permissions"
-            )
+            raise _forbidden_error()
         return current_user
     
     @staticmethod
     async def refresh_access_token(refresh_token: str) -> Optional[Dict[str, str]]:
         """Refresh access token using refresh token"""
         try:
-            payload = verify_token(refresh_token)
+            payload = verify_token_cached(refresh_token)
             
             if payload is None or payload.get("type") != "refresh":
                 return None
@@ -115,26 +168,19 @@ class AuthHandler:
             if username is None:
                 return None
             
-            user = db_manager.get_user_by_username(username)
+            user = await db_manager.aget_user_by_username(username)
             if user is None:
                 return None
             
             # Create new access token
-            token_data = {
-                "sub": user['username'],
-                "user_id": user['id'],
-                "email": user.get('email'),
-                "is_admin": user.get('is_admin', False)
-            }
-            
-            new_access_token = create_access_token(token_data)
+            new_access_token = create_access_token(_build_claims(user))
             
             return {
                 "access_token": new_access_token,
                 "token_type": "bearer"
             }
         except Exception as e:
-            logger.error(f"Error refreshing token: {e}", exc_info=True)
+            logger.error("Error refreshing token: %s", e, exc_info=settings.DEBUG)
             return None
 
 
@@ -152,10 +198,7 @@ AuthHandler.get_current_admin = staticmethod(
 def _verify_admin(current_user: Dict[str, Any]) -> Dict[str, Any]:
     """Internal method to verify admin status"""
     if not current_user.get('is_admin', False):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions"
-        )
+        raise _forbidden_error()
     return current_user
 
 
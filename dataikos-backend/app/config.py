@@ -1,70 +1,94 @@
 import os
-from typing import List
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Callable, List
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
-load_dotenv()
+# On the production host the variables come from the platform, not a .env file
+if os.getenv("ENVIRONMENT", "development") != "production":
+    load_dotenv()
+
+# Single snapshot of the environment, read once by the Settings defaults below
+_env = dict(os.environ)
+
+
+def _g(key: str, default: Any = None, cast: Callable[[str], Any] = str) -> Any:
+    """Read a variable from the environment snapshot, casting non-default values"""
+    value = _env.get(key)
+    if value is None:
+        return default
+    return value if cast is str else cast(value)
+
+
+def _flag(value: str) -> bool:
+    """Parse a 'true'/'false' environment value"""
+    return value.lower() == "true"
 
 
 class Settings(BaseSettings):
     # Application
-    APP_NAME: str = os.getenv("APP_NAME", "DATAIKOŠ Backend")
-    APP_VERSION: str = os.getenv("APP_VERSION", "1.0.0")
-    DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
-    ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
-    FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
+    APP_NAME: str = _g("APP_NAME", "DATAIKOŠ Backend")
+    APP_VERSION: str = _g("APP_VERSION", "1.0.0")
+    DEBUG: bool = _g("DEBUG", False, _flag)
+    ENVIRONMENT: str = _g("ENVIRONMENT", "development")
+    FRONTEND_URL: str = _g("FRONTEND_URL", "http://localhost:3000")
     
     # Supabase
-    SUPABASE_URL: str = os.getenv("SUPABASE_URL")
-    SUPABASE_KEY: str = os.getenv("SUPABASE_KEY")
-    SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+    SUPABASE_URL: str = _g("SUPABASE_URL")
+    SUPABASE_KEY: str = _g("SUPABASE_KEY")
+    SUPABASE_SERVICE_ROLE_KEY: str = _g("SUPABASE_SERVICE_ROLE_KEY")
     
     # Security
-    SECRET_KEY: str = os.getenv("SECRET_KEY", "")
-    ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
-    REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+    SECRET_KEY: str = _g("SECRET_KEY", "")
+    ALGORITHM: str = _g("ALGORITHM", "HS256")
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = _g("ACCESS_TOKEN_EXPIRE_MINUTES", 30, int)
+    REFRESH_TOKEN_EXPIRE_DAYS: int = _g("REFRESH_TOKEN_EXPIRE_DAYS", 7, int)
+    PASSWORD_PEPPER: str = _g("PASSWORD_PEPPER", "")
     
     # Admin
-    ADMIN_USERNAME: str = os.getenv("ADMIN_USERNAME")
-    ADMIN_PASSWORD: str = os.getenv("ADMIN_PASSWORD")
-    ADMIN_EMAIL: str = os.getenv("ADMIN_EMAIL")
+    ADMIN_USERNAME: str = _g("ADMIN_USERNAME")
+    ADMIN_PASSWORD: str = _g("ADMIN_PASSWORD")
+    ADMIN_EMAIL: str = _g("ADMIN_EMAIL")
+    # Seed the admin user at startup; turn off on all but one instance/worker
+    RUN_DB_INIT: bool = _g("RUN_DB_INIT", True, _flag)
     
     # File Upload
-    MAX_FILE_SIZE_MB: int = int(os.getenv("MAX_FILE_SIZE_MB", "5"))
-    ALLOWED_EXTENSIONS: List[str] = os.getenv("ALLOWED_EXTENSIONS", "jpg,jpeg,png,gif,webp").split(",")
-    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "./uploads")
+    MAX_FILE_SIZE_MB: int = _g("MAX_FILE_SIZE_MB", 5, int)
+    ALLOWED_EXTENSIONS: List[str] = _g("ALLOWED_EXTENSIONS", "jpg,jpeg,png,gif,webp").split(",")
+    UPLOAD_DIR: str = _g("UPLOAD_DIR", "./uploads")
     
     # Email Configuration
-    EMAIL_ENABLED: bool = os.getenv("EMAIL_ENABLED", "false").lower() == "true"
-    EMAIL_PROVIDER: str = os.getenv("EMAIL_PROVIDER", "smtp")
-    EMAIL_FROM: str = os.getenv("EMAIL_FROM", "meilleurd2001@gmail.com")
-    EMAIL_FROM_NAME: str = os.getenv("EMAIL_FROM_NAME", "DATAIKOŠ")
+    EMAIL_ENABLED: bool = _g("EMAIL_ENABLED", False, _flag)
+    EMAIL_PROVIDER: str = _g("EMAIL_PROVIDER", "smtp")
+    EMAIL_FROM: str = _g("EMAIL_FROM", "meilleurd2001@gmail.com")
+    EMAIL_FROM_NAME: str = _g("EMAIL_FROM_NAME", "DATAIKOŠ")
     
     # SMTP Configuration
-    SMTP_HOST: str = os.getenv("SMTP_HOST", "smtp.gmail.com")
-    SMTP_PORT: int = int(os.getenv("SMTP_PORT", "587"))
-    SMTP_USERNAME: str = os.getenv("SMTP_USERNAME")
-    SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD")
-    SMTP_USE_TLS: bool = os.getenv("SMTP_USE_TLS", "true").lower() == "true"
+    SMTP_HOST: str = _g("SMTP_HOST", "smtp.gmail.com")
+    SMTP_PORT: int = _g("SMTP_PORT", 587, int)
+    SMTP_USERNAME: str = _g("SMTP_USERNAME")
+    SMTP_PASSWORD: str = _g("SMTP_PASSWORD")
+    SMTP_USE_TLS: bool = _g("SMTP_USE_TLS", True, _flag)
+    SMTP_POOL_SIZE: int = _g("SMTP_POOL_SIZE", 5, int)
     
     # SendGrid Configuration
-    SENDGRID_API_KEY: str = os.getenv("SENDGRID_API_KEY", "")
+    SENDGRID_API_KEY: str = _g("SENDGRID_API_KEY", "")
     
     # Mailgun Configuration
-    MAILGUN_API_KEY: str = os.getenv("MAILGUN_API_KEY", "")
-    MAILGUN_DOMAIN: str = os.getenv("MAILGUN_DOMAIN", "")
+    MAILGUN_API_KEY: str = _g("MAILGUN_API_KEY", "")
+    MAILGUN_DOMAIN: str = _g("MAILGUN_DOMAIN", "")
     
     # Appointment Settings
-    MAX_APPOINTMENTS_PER_SLOT: int = int(os.getenv("MAX_APPOINTMENTS_PER_SLOT", "5"))
-    APPOINTMENT_REMINDER_HOURS: int = int(os.getenv("APPOINTMENT_REMINDER_HOURS", "24"))
-    WORKING_HOURS_START: str = os.getenv("WORKING_HOURS_START", "09:00")
-    WORKING_HOURS_END: str = os.getenv("WORKING_HOURS_END", "18:00")
-    APPOINTMENT_DURATION: int = int(os.getenv("APPOINTMENT_DURATION", "60"))
+    MAX_APPOINTMENTS_PER_SLOT: int = _g("MAX_APPOINTMENTS_PER_SLOT", 5, int)
+    APPOINTMENT_REMINDER_HOURS: int = _g("APPOINTMENT_REMINDER_HOURS", 24, int)
+    WORKING_HOURS_START: str = _g("WORKING_HOURS_START", "09:00")
+    WORKING_HOURS_END: str = _g("WORKING_HOURS_END", "18:00")
+    APPOINTMENT_DURATION: int = _g("APPOINTMENT_DURATION", 60, int)
     
     # Scheduler Settings
-    SCHEDULER_ENABLED: bool = os.getenv("SCHEDULER_ENABLED", "false").lower() == "true"
-    SCHEDULER_CHECK_INTERVAL: int = int(os.getenv("SCHEDULER_CHECK_INTERVAL", "60"))
+    SCHEDULER_ENABLED: bool = _g("SCHEDULER_ENABLED", False, _flag)
+    SCHEDULER_CHECK_INTERVAL: int = _g("SCHEDULER_CHECK_INTERVAL", 60, int)
     
     # CORS
     ALLOWED_ORIGINS: List[str] = [
@@ -79,7 +103,14 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the validated Settings instance (built once)"""
+    return Settings()
+
+
+# Read-only snapshot with plain attributes: cheaper than pydantic attribute access
+settings = SimpleNamespace(**get_settings().model_dump())
 
 # Create upload directory if it doesn't exist
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
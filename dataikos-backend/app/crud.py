@@ -1,9 +1,14 @@
-from typing import List, Optional, Dict, Any
-from datetime import datetime, date, timedelta
+from typing import List, Optional, Dict, Any, Collection, Tuple
+from datetime import date
+import asyncio
 import logging
 
+from pydantic import BaseModel
+
+from app.config import settings
 from app.utils.supabase_client import db_manager
 from app.utils.email_service import email_service
+from app.utils.time_cache import now_iso
 from app.models import (
     OrderCreate,
     MessageCreate,
@@ -13,6 +18,17 @@ from app.models import (
 
 logger = logging.getLogger(__name__)
 
+def _fast_dump(
+    model: BaseModel,
+    exclude: Collection[str] = ()
+) -> Dict[str, Any]:
+    """Shallow dict of a flat model, dates as ISO strings (cheaper than model_dump)"""
+    data = {k: v for k, v in model.__dict__.items() if k not in exclude}
+    for key, value in data.items():
+        if isinstance(value, date):
+            data[key] = value.isoformat()
+    return data
+
 
 class CRUDHandler:
     """
@@ -25,14 +41,20 @@ class CRUDHandler:
     # ==========================
 
     @staticmethod
-    async def create_order(order_data: OrderCreate) -> Optional[Dict[str, Any]]:
+    async def create_order(
+        order_data: OrderCreate
+    ) -> Optional[Dict[str, Any]]:
         """
         Create a new order.
         Optionally creates an appointment if a time slot is provided.
         """
         try:
-            order_dict = order_data.model_dump()
-            now = datetime.utcnow().isoformat()
+            # Scheduling fields are not columns of the orders table
+            order_dict = _fast_dump(
+                order_data,
+                exclude={"appointment_date", "appointment_time", "time_slot_id"}
+            )
+            now = now_iso()
 
             order_dict.update({
                 "created_at": now,
@@ -40,41 +62,67 @@ class CRUDHandler:
                 "status": "pending"
             })
 
-            order = db_manager.create_order(order_dict)
-            if not order:
+            if not order_data.time_slot_id:
+                return await asyncio.to_thread(db_manager.create_order, order_dict)
+
+            # Order, slot booking and appointment in a single transaction
+            appointment_dict = {
+                "time_slot_id": order_data.time_slot_id,
+                "client_email": order_data.client_email,
+                "client_name": order_data.client_name,
+                "client_phone": order_data.client_phone,
+                "service": order_data.service,
+                "notes": order_data.client_description
+            }
+
+            result = await asyncio.to_thread(
+                db_manager.create_order_with_appointment,
+                order_dict,
+                appointment_dict
+            )
+            if not result:
                 return None
 
-            # Create appointment if time slot exists
-            if order_data.time_slot_id:
-                appointment_data = AppointmentCreate(
-                    order_id=order["id"],
-                    time_slot_id=order_data.time_slot_id,
-                    client_email=order_data.client_email,
-                    client_name=order_data.client_name,
-                    client_phone=order_data.client_phone,
-                    service=order_data.service,
-                    notes=order_data.client_description
+            if result.get("appointment"):
+                CRUDHandler._send_appointment_confirmation(
+                    result["appointment"],
+                    result["time_slot"]
                 )
+            else:
+                logger.warning("Time slot fully booked, order created without appointment")
 
-                appointment = await CRUDHandler.create_appointment(appointment_data)
-                if appointment:
-                    db_manager.update_order(
-                        order["id"],
-                        {"appointment_id": appointment["id"]}
-                    )
-                    order["appointment_id"] = appointment["id"]
-
-            return order
+            return result["order"]
 
         except Exception as e:
-            logger.exception("Error creating order")
+            logger.error("Error creating order: %s", e, exc_info=settings.DEBUG)
             return None
 
+    @staticmethod
+    async def bulk_create_orders(orders: List[OrderCreate]) -> int:
+        """Import many orders at once (no slot booking or confirmation email)"""
+        try:
+            now = now_iso()
+            rows = []
+            for order in orders:
+                row = _fast_dump(
+                    order,
+                    exclude={"appointment_date", "appointment_time", "time_slot_id"}
+                )
+                row.update({"created_at": now, "updated_at": now, "status": "pending"})
+                rows.append(row)
+
+            return await asyncio.to_thread(db_manager.bulk_create_orders, rows)
+
+        except Exception as e:
+            logger.error("Error importing orders: %s", e, exc_info=settings.DEBUG)
+            return 0
+
     @staticmethod
     async def get_orders(
         skip: int = 0,
         limit: int = 100,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None
     ) -> List[Dict[str, Any]]:
         """Get orders with optional status filter"""
         try:
@@ -82,10 +130,10 @@ class CRUDHandler:
             if status:
                 filters["status"] = status
 
-            return db_manager.get_orders(filters, limit, skip)
+            return await asyncio.to_thread(db_manager.get_orders, filters, limit, skip, after=after)
 
         except Exception as e:
-            logger.exception("Error fetching orders")
+            logger.error("Error fetching orders: %s", e, exc_info=settings.DEBUG)
             return []
 
     @staticmethod
@@ -98,25 +146,25 @@ class CRUDHandler:
         try:
             update_data = {
                 "status": status,
-                "updated_at": datetime.utcnow().isoformat()
+                "updated_at": now_iso()
             }
 
             if notes:
                 update_data["admin_notes"] = notes
 
-            return db_manager.update_order(order_id, update_data)
+            return await asyncio.to_thread(db_manager.update_order, order_id, update_data)
 
         except Exception as e:
-            logger.exception("Error updating order status")
+            logger.error("Error updating order status: %s", e, exc_info=settings.DEBUG)
             return None
 
     @staticmethod
     async def delete_order(order_id: str) -> bool:
         """Delete order"""
         try:
-            return db_manager.delete_order(order_id)
-        except Exception:
-            logger.exception("Error deleting order")
+            return await asyncio.to_thread(db_manager.delete_order, order_id)
+        except Exception as e:
+            logger.error("Error deleting order: %s", e, exc_info=settings.DEBUG)
             return False
 
     # ==========================
@@ -132,9 +180,7 @@ class CRUDHandler:
         Includes rollback protection.
         """
         try:
-            time_slot = db_manager.get_time_slot(
-                appointment_data.time_slot_id
-            )
+            time_slot = await db_manager.aget_time_slot(appointment_data.time_slot_id)
             if not time_slot:
                 logger.warning("Time slot not found")
                 return None
@@ -146,78 +192,94 @@ class CRUDHandler:
                 logger.warning("Time slot fully booked")
                 return None
 
-            now = datetime.utcnow().isoformat()
-            appointment_dict = appointment_data.model_dump()
+            now = now_iso()
+            appointment_dict = _fast_dump(appointment_data)
             appointment_dict.update({
                 "created_at": now,
                 "updated_at": now,
                 "status": "confirmed"
             })
 
-            appointment = db_manager.create_appointment(appointment_dict)
+            appointment = await asyncio.to_thread(db_manager.create_appointment, appointment_dict)
             if not appointment:
                 return None
 
-            if not db_manager.increment_time_slot_bookings(
+            if not await asyncio.to_thread(
+                db_manager.increment_time_slot_bookings,
                 appointment_data.time_slot_id
             ):
-                db_manager.delete_appointment(appointment["id"])
+                await asyncio.to_thread(db_manager.delete_appointment, appointment["id"])
                 return None
 
-            # Send confirmation email (non-blocking)
-            try:
-                email_service.send_appointment_confirmation(
-                    to_email=appointment_data.client_email,
-                    client_name=appointment_data.client_name,
-                    appointment_date=time_slot.get("date"),
-                    appointment_time=time_slot.get("start_time"),
-                    service=appointment_data.service,
-                    price=0,
-                    notes=appointment_data.notes
-                )
-            except Exception:
-                logger.warning("Appointment created but email failed")
+            CRUDHandler._send_appointment_confirmation(
+                appointment,
+                time_slot
+            )
 
             return appointment
 
-        except Exception:
-            logger.exception("Error creating appointment")
+        except Exception as e:
+            logger.error("Error creating appointment: %s", e, exc_info=settings.DEBUG)
             return None
 
+    @staticmethod
+    def _send_appointment_confirmation(
+        appointment: Dict[str, Any],
+        time_slot: Dict[str, Any]
+    ) -> None:
+        """Queue the confirmation email for the background sender"""
+        try:
+            email_service.enqueue(**email_service.render_appointment_confirmation(
+                to_email=appointment["client_email"],
+                client_name=appointment["client_name"],
+                appointment_date=time_slot.get("date"),
+                appointment_time=time_slot.get("start_time"),
+                service=appointment["service"],
+                price=0,
+                notes=appointment.get("notes")
+            ))
+        except Exception:
+            logger.warning("Appointment created but email failed")
+
     @staticmethod
     async def cancel_appointment(appointment_id: str) -> bool:
         """Cancel appointment"""
         try:
-            appointment = db_manager.get_appointment(appointment_id)
+            appointment = await asyncio.to_thread(db_manager.get_appointment, appointment_id)
             if not appointment:
                 return False
 
-            updated = db_manager.update_appointment(
+            updated = await asyncio.to_thread(
+                db_manager.update_appointment,
                 appointment_id,
                 {
                     "status": "cancelled",
-                    "updated_at": datetime.utcnow().isoformat()
+                    "updated_at": now_iso()
                 }
             )
 
             if not updated:
                 return False
 
-            return db_manager.decrement_time_slot_bookings(
+            return await asyncio.to_thread(
+                db_manager.decrement_time_slot_bookings,
                 appointment["time_slot_id"]
             )
 
-        except Exception:
-            logger.exception("Error cancelling appointment")
+        except Exception as e:
+            logger.error("Error cancelling appointment: %s", e, exc_info=settings.DEBUG)
             return False
 
     @staticmethod
-    async def get_available_slots(date_obj: date) -> List[Dict[str, Any]]:
-        """Get available time slots for a date"""
+    async def get_available_slots(
+        date_obj: date,
+        only_available: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Get time slots of a date with availability (only bookable ones if asked)"""
         try:
-            return db_manager.get_available_slots(date_obj)
-        except Exception:
-            logger.exception("Error fetching available slots")
+            return await db_manager.aget_available_slots(date_obj, only_available)
+        except Exception as e:
+            logger.error("Error fetching available slots: %s", e, exc_info=settings.DEBUG)
             return []
 
     @staticmethod
@@ -228,21 +290,16 @@ class CRUDHandler:
     ) -> List[Dict[str, Any]]:
         """Generate time slots for a date range"""
         try:
-            slots = []
-            current_date = start_date
-
-            while current_date <= end_date:
-                daily_slots = db_manager.generate_time_slots_for_date(
-                    current_date,
-                    service_duration
-                )
-                slots.extend(daily_slots)
-                current_date += timedelta(days=1)
-
-            return slots
+            # Missing dates of the whole range are inserted in one request
+            return await asyncio.to_thread(
+                db_manager.generate_time_slots_for_range,
+                start_date,
+                end_date,
+                service_duration
+            )
 
-        except Exception:
-            logger.exception("Error generating time slots")
+        except Exception as e:
+            logger.error("Error generating time slots: %s", e, exc_info=settings.DEBUG)
             return []
 
     # ==========================
@@ -255,21 +312,22 @@ class CRUDHandler:
     ) -> Optional[Dict[str, Any]]:
         """Create new message"""
         try:
-            message_dict = message_data.model_dump()
-            message_dict["created_at"] = datetime.utcnow().isoformat()
+            message_dict = _fast_dump(message_data)
+            message_dict["created_at"] = now_iso()
             message_dict["status"] = "unread"
 
-            return db_manager.create_message(message_dict)
+            return await asyncio.to_thread(db_manager.create_message, message_dict)
 
-        except Exception:
-            logger.exception("Error creating message")
+        except Exception as e:
+            logger.error("Error creating message: %s", e, exc_info=settings.DEBUG)
             return None
 
     @staticmethod
     async def get_messages(
         skip: int = 0,
         limit: int = 100,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None
     ) -> List[Dict[str, Any]]:
         """Get messages with optional status filter"""
         try:
@@ -277,36 +335,46 @@ class CRUDHandler:
             if status:
                 filters["status"] = status
 
-            return db_manager.get_messages(filters, limit, skip)
+            return await asyncio.to_thread(db_manager.get_messages, filters, limit, skip, after=after)
 
-        except Exception:
-            logger.exception("Error fetching messages")
+        except Exception as e:
+            logger.error("Error fetching messages: %s", e, exc_info=settings.DEBUG)
             return []
 
+    @staticmethod
+    async def get_message_by_id(message_id: str) -> Optional[Dict[str, Any]]:
+        """Get message by ID"""
+        try:
+            return await asyncio.to_thread(db_manager.get_message_by_id, message_id)
+        except Exception as e:
+            logger.error("Error fetching message: %s", e, exc_info=settings.DEBUG)
+            return None
+
     @staticmethod
     async def mark_message_as_read(
         message_id: str
     ) -> Optional[Dict[str, Any]]:
         """Mark message as read"""
         try:
-            return db_manager.update_message(
+            return await asyncio.to_thread(
+                db_manager.update_message,
                 message_id,
                 {
                     "status": "read",
-                    "read_at": datetime.utcnow().isoformat()
+                    "read_at": now_iso()
                 }
             )
-        except Exception:
-            logger.exception("Error marking message as read")
+        except Exception as e:
+            logger.error("Error marking message as read: %s", e, exc_info=settings.DEBUG)
             return None
 
     @staticmethod
     async def delete_message(message_id: str) -> bool:
         """Delete message"""
         try:
-            return db_manager.delete_message(message_id)
-        except Exception:
-            logger.exception("Error deleting message")
+            return await asyncio.to_thread(db_manager.delete_message, message_id)
+        except Exception as e:
+            logger.error("Error deleting message: %s", e, exc_info=settings.DEBUG)
             return False
 
     # ==========================
@@ -319,20 +387,21 @@ class CRUDHandler:
     ) -> Optional[Dict[str, Any]]:
         """Create new gallery item"""
         try:
-            item_dict = item_data.model_dump()
-            item_dict["created_at"] = datetime.utcnow().isoformat()
+            item_dict = _fast_dump(item_data)
+            item_dict["created_at"] = now_iso()
 
-            return db_manager.create_gallery_item(item_dict)
+            return await asyncio.to_thread(db_manager.create_gallery_item, item_dict)
 
-        except Exception:
-            logger.exception("Error creating gallery item")
+        except Exception as e:
+            logger.error("Error creating gallery item: %s", e, exc_info=settings.DEBUG)
             return None
 
     @staticmethod
     async def get_gallery_items(
         skip: int = 0,
         limit: int = 100,
-        category: Optional[str] = None
+        category: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None
     ) -> List[Dict[str, Any]]:
         """Get gallery items with optional category filter"""
         try:
@@ -340,19 +409,19 @@ class CRUDHandler:
             if category:
                 filters["category"] = category
 
-            return db_manager.get_gallery_items(filters, limit, skip)
+            return await asyncio.to_thread(db_manager.get_gallery_items, filters, limit, skip, after)
 
-        except Exception:
-            logger.exception("Error fetching gallery items")
+        except Exception as e:
+            logger.error("Error fetching gallery items: %s", e, exc_info=settings.DEBUG)
             return []
 
     @staticmethod
     async def delete_gallery_item(item_id: str) -> bool:
         """Delete gallery item"""
         try:
-            return db_manager.delete_gallery_item(item_id)
-        except Exception:
-            logger.exception("Error deleting gallery item")
+            return await asyncio.to_thread(db_manager.delete_gallery_item, item_id)
+        except Exception as e:
+            logger.error("Error deleting gallery item: %s", e, exc_info=settings.DEBUG)
             return False
 
     # ==========================
@@ -363,9 +432,9 @@ class CRUDHandler:
     async def get_dashboard_stats() -> Dict[str, Any]:
         """Get dashboard statistics"""
         try:
-            return db_manager.get_stats()
-        except Exception:
-            logger.exception("Error fetching dashboard stats")
+            return await asyncio.to_thread(db_manager.get_stats)
+        except Exception as e:
+            logger.error("Error fetching dashboard stats: %s", e, exc_info=settings.DEBUG)
             return {}
 
     # ==========================
@@ -378,9 +447,9 @@ class CRUDHandler:
     ) -> Optional[Dict[str, Any]]:
         """Create new user"""
         try:
-            return db_manager.create_user(user_data)
-        except Exception:
-            logger.exception("Error creating user")
+            return await asyncio.to_thread(db_manager.create_user, user_data)
+        except Exception as e:
+            logger.error("Error creating user: %s", e, exc_info=settings.DEBUG)
             return None
 
     @staticmethod
@@ -390,15 +459,16 @@ class CRUDHandler:
     ) -> Optional[Dict[str, Any]]:
         """Update user password"""
         try:
-            return db_manager.update_user(
+            return await asyncio.to_thread(
+                db_manager.update_user,
                 user_id,
                 {
                     "password_hash": new_password_hash,
-                    "updated_at": datetime.utcnow().isoformat()
+                    "updated_at": now_iso()
                 }
             )
-        except Exception:
-            logger.exception("Error updating user password")
+        except Exception as e:
+            logger.error("Error updating user password: %s", e, exc_info=settings.DEBUG)
             return None
 
 
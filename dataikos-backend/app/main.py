@@ -1,17 +1,27 @@
 import logging
 import asyncio
+import re
 from contextlib import asynccontextmanager
 from typing import Dict, Any
 from datetime import datetime
 
 from fastapi import FastAPI, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
+import PIL
+from PIL import features as pil_features
 
 from app.config import settings
 from app.utils.supabase_client import db_manager
-from app.utils.scheduler import scheduler
+from app.utils.email_service import email_service
+from app.utils.scheduler import reminder_queue, scheduler
+from app.utils.responses import ORJSONResponse
+from app.utils.request_cache import RequestCacheMiddleware
+from app.utils.security import (
+    verify_dummy_password,
+    create_access_token,
+    verify_token
+)
 from app.routes import auth, orders, messages, gallery, admin, appointments
 
 
@@ -37,9 +47,25 @@ async def lifespan(app: FastAPI):
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"Debug mode: {settings.DEBUG}")
 
-    # Initialize database (SYNC)
-    logger.info("Initializing database...")
-    db_manager.initialize_database()
+    # Initialize database (SYNC), unless another worker is in charge of it
+    if settings.RUN_DB_INIT:
+        db_manager.initialize_database()
+
+    # Pay one-time auth costs now rather than on the first login:
+    # the dummy bcrypt hash and the JWT verifier are both built lazily
+    await asyncio.to_thread(verify_dummy_password, "warmup")
+    verify_token(create_access_token({"sub": "_warmup"}))
+
+    # Reminder emails are sent in batches by a background worker
+    reminder_task = asyncio.create_task(reminder_queue.run())
+
+    # Other emails (confirmations) are queued and sent off the request path
+    email_task = asyncio.create_task(email_service.run_worker())
+
+    # Gallery uploads decode/encode JPEG on every request
+    logger.info(f"Pillow {PIL.__version__}")
+    if not pil_features.check_feature("libjpeg_turbo"):
+        logger.warning("Pillow is not linked against libjpeg-turbo: image uploads will be slower")
 
     # Start scheduler if enabled
     scheduler_task = None
@@ -61,6 +87,24 @@ async def lifespan(app: FastAPI):
             pass
         logger.info("Scheduler stopped")
 
+    reminder_task.cancel()
+    try:
+        await reminder_task
+    except asyncio.CancelledError:
+        pass
+
+    await email_service.drain(timeout=10)
+    email_task.cancel()
+    try:
+        await email_task
+    except asyncio.CancelledError:
+        pass
+
+    gallery.IMAGE_POOL.shutdown(cancel_futures=True)
+    email_service.close()
+    await db_manager.aclose()
+    db_manager.close()
+
 
 # =========================
 # FASTAPI APP
@@ -73,6 +117,7 @@ app = FastAPI(
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
@@ -80,15 +125,28 @@ app = FastAPI(
 # CORS
 # =========================
 
+def _origins_regex(origins) -> str:
+    """Build one anchored regex from ALLOWED_ORIGINS ('*' matches a subdomain label)"""
+    patterns = (
+        re.escape(origin).replace(r"\*", "[a-z0-9-]+")
+        for origin in origins
+    )
+    return "^(?:" + "|".join(patterns) + ")$"
+
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.ALLOWED_ORIGINS,
+    allow_origins=[],
+    allow_origin_regex=_origins_regex(settings.ALLOWED_ORIGINS),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
     expose_headers=["*"],
 )
 
+# Per-request memoization of rows read several times by one request
+app.add_middleware(RequestCacheMiddleware)
+
 
 # =========================
 # STATIC FILES
@@ -121,7 +179,7 @@ app.include_router(appointments.router)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error("Uncaught exception", exc_info=True)
 
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "detail": "Internal server error",
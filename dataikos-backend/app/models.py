@@ -1,7 +1,9 @@
 from datetime import datetime, date
-from typing import Optional, List
+from typing import Optional, List, TypedDict
 from pydantic import BaseModel, EmailStr, Field, validator
-import re
+
+# Characters kept when normalizing phone numbers
+_PHONE_CHARS = frozenset("0123456789+")
 
 
 # =========================
@@ -21,12 +23,16 @@ class UserCreate(UserBase):
     password: str
 
 
-class UserInDB(UserBase):
-    """User in database model"""
+class UserInDB(TypedDict, total=False):
+    """User row as returned by the database (typing only, never validated)"""
     id: str
+    username: str
+    email: str
     password_hash: str
-    created_at: datetime
-    updated_at: datetime
+    is_admin: bool
+    is_active: bool
+    created_at: str
+    updated_at: str
 
 
 class UserUpdate(BaseModel):
@@ -53,12 +59,16 @@ class TimeSlotCreate(TimeSlotBase):
     pass
 
 
-class TimeSlotInDB(TimeSlotBase):
-    """Time slot in database model"""
+class TimeSlotInDB(TypedDict, total=False):
+    """Time slot row as returned by the database (typing only, never validated)"""
     id: str
-    current_bookings: int = 0
-    created_at: datetime
-    updated_at: datetime
+    date: str
+    start_time: str
+    end_time: str
+    max_capacity: int
+    current_bookings: int
+    created_at: str
+    updated_at: str
 
 
 class TimeSlotUpdate(BaseModel):
@@ -87,13 +97,20 @@ class AppointmentCreate(AppointmentBase):
     pass
 
 
-class AppointmentInDB(AppointmentBase):
-    """Appointment in database model"""
+class AppointmentInDB(TypedDict, total=False):
+    """Appointment row as returned by the database (typing only, never validated)"""
     id: str
-    status: str = "confirmed"
-    reminder_sent: bool = False
-    created_at: datetime
-    updated_at: datetime
+    order_id: Optional[str]
+    time_slot_id: str
+    client_email: str
+    client_name: str
+    client_phone: str
+    service: str
+    notes: Optional[str]
+    status: str
+    reminder_sent: bool
+    created_at: str
+    updated_at: str
 
 
 class AppointmentUpdate(BaseModel):
@@ -131,7 +148,7 @@ class OrderBase(BaseModel):
     @validator('client_phone')
     def validate_phone(cls, v):
         """Validate phone number"""
-        phone = re.sub(r'[^\d+]', '', v)
+        phone = "".join(filter(_PHONE_CHARS.__contains__, v))
         if len(phone) < 9:
             raise ValueError('Numéro de téléphone invalide')
         return phone
@@ -144,14 +161,21 @@ class OrderCreate(OrderBase):
     time_slot_id: Optional[str] = None
 
 
-class OrderInDB(OrderBase):
-    """Order in database model"""
+class OrderInDB(TypedDict, total=False):
+    """Order row as returned by the database (typing only, never validated)"""
     id: str
-    status: str = "pending"
-    appointment_id: Optional[str] = None
-    admin_notes: Optional[str] = None
-    created_at: datetime
-    updated_at: datetime
+    service: str
+    formula: str
+    price: float
+    client_name: str
+    client_email: str
+    client_phone: str
+    client_description: Optional[str]
+    status: str
+    appointment_id: Optional[str]
+    admin_notes: Optional[str]
+    created_at: str
+    updated_at: str
 
 
 class OrderUpdate(BaseModel):
@@ -178,12 +202,17 @@ class MessageCreate(MessageBase):
     pass
 
 
-class MessageInDB(MessageBase):
-    """Message in database model"""
+class MessageInDB(TypedDict, total=False):
+    """Message row as returned by the database (typing only, never validated)"""
     id: str
-    status: str = "unread"
-    read_at: Optional[datetime] = None
-    created_at: datetime
+    name: str
+    email: str
+    subject: str
+    message: str
+    phone: Optional[str]
+    status: str
+    read_at: Optional[str]
+    created_at: str
 
 
 class MessageUpdate(BaseModel):
@@ -202,6 +231,8 @@ class GalleryItemBase(BaseModel):
     category: str
     description: Optional[str] = None
     image_url: str
+    thumbnail_url: Optional[str] = None
+    webp_url: Optional[str] = None
 
 
 class GalleryItemCreate(GalleryItemBase):
@@ -209,10 +240,16 @@ class GalleryItemCreate(GalleryItemBase):
     pass
 
 
-class GalleryItemInDB(GalleryItemBase):
-    """Gallery item in database model"""
+class GalleryItemInDB(TypedDict, total=False):
+    """Gallery row as returned by the database (typing only, never validated)"""
     id: str
-    created_at: datetime
+    title: str
+    category: str
+    description: Optional[str]
+    image_url: str
+    thumbnail_url: Optional[str]
+    webp_url: Optional[str]
+    created_at: str
 
 
 class GalleryItemUpdate(BaseModel):
@@ -242,12 +279,19 @@ class ServiceCreate(ServiceBase):
     formulas: Optional[List[dict]] = []
 
 
-class ServiceInDB(ServiceBase):
-    """Service in database model"""
+class ServiceInDB(TypedDict, total=False):
+    """Service row as returned by the database (typing only, never validated)"""
     id: str
-    formulas: List[dict] = []
-    created_at: datetime
-    updated_at: datetime
+    name: str
+    description: str
+    category: str
+    icon: str
+    base_price: float
+    duration_minutes: int
+    active: bool
+    formulas: List[dict]
+    created_at: str
+    updated_at: str
 
 
 class ServiceUpdate(BaseModel):
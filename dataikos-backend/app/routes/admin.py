@@ -1,88 +1,136 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 from app.auth import auth_handler
 from app.crud import crud_handler
 from app.utils.supabase_client import db_manager
-from datetime import datetime, timedelta
+from app.routes.gallery import save_errors as gallery_save_errors
+from app.utils.responses import ORJSONResponse
+from app.utils.cache import TTLCache
+from app.config import settings
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+import asyncio
+import heapq
+import platform
+import orjson
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
 
+# Chart labels, built with f-strings rather than strftime
+def _day_label(moment: datetime) -> str:
+    return f"{moment.day:02d}/{moment.month:02d}"
+
+def _week_label(moment: datetime) -> str:
+    return f"{moment.isocalendar().week:02d}"
+
+def _month_label(moment: datetime) -> str:
+    return f"{moment.month:02d}/{moment.year}"
+
+# Chart period -> (span covered, date_trunc bucket, label builder)
+_CHART_PERIODS = {
+    "7d": (timedelta(days=7), "day", _day_label),
+    "30d": (timedelta(days=30), "day", _day_label),
+    "90d": (timedelta(days=90), "week", _week_label),  # Week number
+    "1y": (timedelta(days=365), "month", _month_label),
+}
+_DEFAULT_CHART_PERIOD = _CHART_PERIODS["7d"]
+
+def _chart_window(period: str):
+    """Return (start_date, bucket, label builder) for a chart period"""
+    span, bucket, make_label = _CHART_PERIODS.get(period, _DEFAULT_CHART_PERIOD)
+    return datetime.now(timezone.utc) - span, bucket, make_label
+
 @router.get("/dashboard/stats")
 async def get_admin_stats(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get admin dashboard statistics"""
+    cached = db_manager.dashboard_cache.get("stats")
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     stats = await crud_handler.get_dashboard_stats()
     
-    # Calculate daily averages
-    try:
-        orders = await db_manager.get_orders()
-        
-        if orders and len(orders) > 0:
-            # Calculate average order value
-            total_revenue = stats.get('total_revenue', 0)
-            total_orders = stats.get('total_orders', 0)
-            avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
-            
-            # Calculate conversion rate (if we had visitor data)
-            # For now, we'll use a placeholder
-            conversion_rate = 0.15
-            
-            stats['avg_order_value'] = round(avg_order_value, 2)
-            stats['conversion_rate'] = round(conversion_rate * 100, 1)
-        else:
-            stats['avg_order_value'] = 0
-            stats['conversion_rate'] = 0
-    except Exception:
+    # Calculate average order value
+    total_revenue = stats.get('total_revenue') or 0
+    total_orders = stats.get('total_orders') or 0
+    
+    if total_orders > 0:
+        # Calculate conversion rate (if we had visitor data)
+        # For now, we'll use a placeholder
+        conversion_rate = 0.15
+        
+        stats['avg_order_value'] = round(total_revenue / total_orders, 2)
+        stats['conversion_rate'] = round(conversion_rate * 100, 1)
+    else:
         stats['avg_order_value'] = 0
         stats['conversion_rate'] = 0
     
-    return stats
+    db_manager.dashboard_cache.set("stats", stats)
+    return ORJSONResponse(stats)
+
+# Only the fields read by the recent-activity entries below
+_ORDER_ACTIVITY_COLUMNS = "id,service,client_name,price,status,created_at"
+_MESSAGE_ACTIVITY_COLUMNS = "id,subject,name,status,created_at"
+
+def _as_order_activity(order: Dict[str, Any]) -> Dict[str, Any]:
+    """Recent-activity entry for an order"""
+    return {
+        "type": "order",
+        "id": order.get('id'),
+        "title": f"New order: {order.get('service', 'Unknown')}",
+        "description": f"From {order.get('client_name', 'Unknown')}",
+        "amount": order.get('price', 0),
+        "status": order.get('status', 'pending'),
+        "timestamp": order.get('created_at'),
+        "icon": "shopping-cart"
+    }
+
+def _as_message_activity(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Recent-activity entry for a contact message"""
+    return {
+        "type": "message",
+        "id": message.get('id'),
+        "title": f"New message: {message.get('subject', 'No subject')}",
+        "description": f"From {message.get('name', 'Unknown')}",
+        "status": message.get('status', 'unread'),
+        "timestamp": message.get('created_at'),
+        "icon": "message"
+    }
 
 @router.get("/recent-activity")
 async def get_recent_activity(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get recent activity for admin dashboard"""
+    cached = db_manager.dashboard_cache.get("recent-activity")
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     try:
-        # Get recent orders (last 10)
-        recent_orders = await db_manager.get_orders(limit=10)
-        
-        # Get recent messages (last 10)
-        recent_messages = await db_manager.get_messages(limit=10)
-        
-        activity = []
-        
-        # Add orders to activity
-        for order in recent_orders:
-            activity.append({
-                "type": "order",
-                "id": order.get('id'),
-                "title": f"New order: {order.get('service', 'Unknown')}",
-                "description": f"From {order.get('client_name', 'Unknown')}",
-                "amount": order.get('price', 0),
-                "status": order.get('status', 'pending'),
-                "timestamp": order.get('created_at'),
-                "icon": "shopping-cart"
-            })
-        
-        # Add messages to activity
-        for message in recent_messages:
-            activity.append({
-                "type": "message",
-                "id": message.get('id'),
-                "title": f"New message: {message.get('subject', 'No subject')}",
-                "description": f"From {message.get('name', 'Unknown')}",
-                "status": message.get('status', 'unread'),
-                "timestamp": message.get('created_at'),
-                "icon": "message"
-            })
+        # Get recent orders and messages (last 10 each), fetched concurrently
+        recent_orders, recent_messages = await asyncio.gather(
+            asyncio.to_thread(
+                db_manager.get_orders, limit=10, columns=_ORDER_ACTIVITY_COLUMNS
+            ),
+            asyncio.to_thread(
+                db_manager.get_messages, limit=10, columns=_MESSAGE_ACTIVITY_COLUMNS
+            )
+        )
         
-        # Sort by timestamp
-        activity.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        # Both lists are already newest first: merge instead of re-sorting
+        merged = heapq.merge(
+            map(_as_order_activity, recent_orders),
+            map(_as_message_activity, recent_messages),
+            key=lambda x: x['timestamp'] or '',
+            reverse=True
+        )
         
         # Return top 15
-        return activity[:15]
+        activity = list(islice(merged, 15))
+        db_manager.dashboard_cache.set("recent-activity", activity)
+        return ORJSONResponse(activity)
         
     except Exception as e:
         raise HTTPException(
@@ -96,56 +144,28 @@ async def get_revenue_chart_data(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get revenue chart data for different periods"""
+    cache_key = f"revenue:{period}"
+    cached = db_manager.dashboard_cache.get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     try:
-        orders = await db_manager.get_orders()
-        
-        if not orders:
-            return {"labels": [], "data": []}
-        
-        # Filter by period
-        end_date = datetime.now()
+        start_date, bucket, make_label = _chart_window(period)
         
-        if period == "7d":
-            start_date = end_date - timedelta(days=7)
-            date_format = "%d/%m"
-        elif period == "30d":
-            start_date = end_date - timedelta(days=30)
-            date_format = "%d/%m"
-        elif period == "90d":
-            start_date = end_date - timedelta(days=90)
-            date_format = "%W"  # Week number
-        elif period == "1y":
-            start_date = end_date - timedelta(days=365)
-            date_format = "%m/%Y"
-        else:
-            start_date = end_date - timedelta(days=7)
-            date_format = "%d/%m"
+        # Revenue is summed per bucket by the database, oldest first
+        buckets = await asyncio.to_thread(db_manager.get_revenue_buckets, start_date, bucket)
         
-        # Group orders by date
-        revenue_by_date = {}
+        labels = [make_label(datetime.fromisoformat(row['bucket'])) for row in buckets]
+        data = [row['revenue'] for row in buckets]
         
-        for order in orders:
-            try:
-                order_date = datetime.fromisoformat(order.get('created_at', '').replace('Z', '+00:00'))
-                
-                if order_date >= start_date:
-                    date_key = order_date.strftime(date_format)
-                    
-                    if order.get('status') == 'completed' and order.get('price'):
-                        revenue_by_date[date_key] = revenue_by_date.get(date_key, 0) + order['price']
-            except:
-                continue
-        
-        # Convert to sorted lists
-        labels = sorted(revenue_by_date.keys())
-        data = [revenue_by_date[label] for label in labels]
-        
-        return {
+        chart_data = {
             "labels": labels,
             "data": data,
             "total": sum(data),
             "period": period
         }
+        db_manager.dashboard_cache.set(cache_key, chart_data)
+        return ORJSONResponse(chart_data)
         
     except Exception as e:
         raise HTTPException(
@@ -159,52 +179,19 @@ async def get_orders_chart_data(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get orders chart data for different periods"""
+    cache_key = f"orders:{period}"
+    cached = db_manager.dashboard_cache.get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     try:
-        orders = await db_manager.get_orders()
+        start_date, bucket, make_label = _chart_window(period)
         
-        if not orders:
-            return {"labels": [], "data": []}
-        
-        # Filter by period
-        end_date = datetime.now()
-        
-        if period == "7d":
-            start_date = end_date - timedelta(days=7)
-            date_format = "%d/%m"
-        elif period == "30d":
-            start_date = end_date - timedelta(days=30)
-            date_format = "%d/%m"
-        elif period == "90d":
-            start_date = end_date - timedelta(days=90)
-            date_format = "%W"
-        elif period == "1y":
-            start_date = end_date - timedelta(days=365)
-            date_format = "%m/%Y"
-        else:
-            start_date = end_date - timedelta(days=7)
-            date_format = "%d/%m"
-        
-        # Group orders by date and status
-        orders_by_date = {}
+        # Orders are counted per bucket and status by the database, oldest first
+        buckets = await asyncio.to_thread(db_manager.get_orders_status_buckets, start_date, bucket)
         statuses = ['pending', 'completed', 'cancelled']
         
-        for order in orders:
-            try:
-                order_date = datetime.fromisoformat(order.get('created_at', '').replace('Z', '+00:00'))
-                
-                if order_date >= start_date:
-                    date_key = order_date.strftime(date_format)
-                    status = order.get('status', 'pending')
-                    
-                    if date_key not in orders_by_date:
-                        orders_by_date[date_key] = {s: 0 for s in statuses}
-                    
-                    orders_by_date[date_key][status] = orders_by_date[date_key].get(status, 0) + 1
-            except:
-                continue
-        
-        # Convert to chart data
-        labels = sorted(orders_by_date.keys())
+        labels = [make_label(datetime.fromisoformat(row['bucket'])) for row in buckets]
         
         chart_data = {
             "labels": labels,
@@ -218,7 +205,7 @@ async def get_orders_chart_data(
         }
         
         for status in statuses:
-            data = [orders_by_date.get(label, {}).get(status, 0) for label in labels]
+            data = [row[status] for row in buckets]
             
             chart_data["datasets"].append({
                 "label": status.capitalize(),
@@ -228,7 +215,8 @@ async def get_orders_chart_data(
                 "borderWidth": 1
             })
         
-        return chart_data
+        db_manager.dashboard_cache.set(cache_key, chart_data)
+        return ORJSONResponse(chart_data)
         
     except Exception as e:
         raise HTTPException(
@@ -241,27 +229,15 @@ async def get_popular_services(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get most popular services"""
+    cached = db_manager.dashboard_cache.get("popular-services")
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     try:
-        orders = await db_manager.get_orders()
-        
-        if not orders:
-            return []
-        
-        # Count orders by service
-        service_counts = {}
-        
-        for order in orders:
-            service = order.get('service', 'Unknown')
-            service_counts[service] = service_counts.get(service, 0) + 1
-        
-        # Sort by count
-        popular_services = [
-            {"service": service, "count": count}
-            for service, count in sorted(service_counts.items(), 
-                                        key=lambda x: x[1], reverse=True)
-        ]
-        
-        return popular_services[:10]  # Top 10
+        # Top 10, counted and sorted by the database
+        popular_services = await asyncio.to_thread(db_manager.get_service_counts, limit=10)
+        db_manager.dashboard_cache.set("popular-services", popular_services)
+        return ORJSONResponse(popular_services)
         
     except Exception as e:
         raise HTTPException(
@@ -273,95 +249,107 @@ async def get_popular_services(
 async def create_backup(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
-    """Create database backup (admin only)"""
-    try:
-        # Get all data
-        orders = await db_manager.get_orders()
-        messages = await db_manager.get_messages()
-        gallery_items = await crud_handler.get_gallery_items()
-        
-        backup_data = {
-            "timestamp": datetime.now().isoformat(),
-            "orders": orders,
-            "messages": messages,
-            "gallery": gallery_items,
-            "backup_type": "manual"
+    """Create database backup (admin only), streamed as NDJSON"""
+    timestamp = datetime.now().isoformat()
+    
+    return StreamingResponse(
+        _backup_lines(timestamp),
+        media_type="application/x-ndjson",
+        headers={
+            "Content-Disposition": f'attachment; filename="backup-{timestamp[:10]}.ndjson"'
         }
+    )
+
+# (record type, table) pairs exported by /backup
+_BACKUP_TABLES = (
+    ("order", "orders"),
+    ("message", "contact_messages"),
+    ("gallery", "gallery"),
+)
+
+def _backup_lines(timestamp: str) -> Iterator[bytes]:
+    """One JSON line per row, read and sent page by page so memory stays flat"""
+    yield orjson.dumps({"type": "backup", "timestamp": timestamp, "backup_type": "manual"}) + b"\n"
+    
+    dumps = orjson.dumps
+    for record_type, table in _BACKUP_TABLES:
+        for rows in db_manager.iter_pages(table):
+            # One chunk per page rather than one ASGI message per row
+            yield b"".join(
+                dumps({"type": record_type, **row}, option=orjson.OPT_APPEND_NEWLINE)
+                for row in rows
+            )
+
+# Host description, fixed for the life of the process
+_STATIC_SYSTEM_INFO = {
+    "platform": platform.platform(),
+    "python_version": platform.python_version(),
+    "processor": platform.processor(),
+}
+
+# Memory/disk readings, refreshed at most every 5 seconds
+_resource_cache = TTLCache(maxsize=1, ttl=5)
+
+def _resource_usage() -> Dict[str, Any]:
+    """Memory and disk usage snapshot (cached briefly)"""
+    usage = _resource_cache.get("usage")
+    if usage is None:
+        import psutil
         
-        # You could save this to a file or cloud storage
-        # For now, we'll just return it
-        
-        return {
-            "message": "Backup created successfully",
-            "timestamp": backup_data["timestamp"],
-            "stats": {
-                "orders": len(orders),
-                "messages": len(messages),
-                "gallery_items": len(gallery_items)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        usage = {
+            "memory": {
+                "total": memory.total,
+                "available": memory.available,
+                "percent": memory.percent,
+                "used": memory.used,
+                "free": memory.free
+            },
+            "disk": {
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free,
+                "percent": disk.percent
             }
         }
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error creating backup: {str(e)}"
-        )
+        _resource_cache.set("usage", usage)
+    return usage
 
 @router.get("/system/health")
 async def system_health_check(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Check system health and status"""
-    import psutil
-    import platform
-    
     try:
-        # System info
-        system_info = {
-            "platform": platform.platform(),
-            "python_version": platform.python_version(),
-            "processor": platform.processor(),
-        }
-        
-        # Memory usage
-        memory = psutil.virtual_memory()
-        memory_info = {
-            "total": memory.total,
-            "available": memory.available,
-            "percent": memory.percent,
-            "used": memory.used,
-            "free": memory.free
-        }
+        usage = _resource_usage()
         
-        # Disk usage
-        disk = psutil.disk_usage('/')
-        disk_info = {
-            "total": disk.total,
-            "used": disk.used,
-            "free": disk.free,
-            "percent": disk.percent
-        }
-        
-        # Database connection check
+        # Database connection check (never cached, but bounded)
         db_status = "healthy"
         try:
-            await db_manager.get_orders(limit=1)
+            await asyncio.wait_for(
+                asyncio.to_thread(db_manager.get_orders, limit=1, columns="id"),
+                timeout=0.5
+            )
+        except asyncio.TimeoutError:
+            db_status = "error: timeout"
         except Exception as e:
             db_status = f"error: {str(e)}"
         
-        return {
+        return ORJSONResponse({
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
-            "system": system_info,
-            "memory": memory_info,
-            "disk": disk_info,
+            "system": _STATIC_SYSTEM_INFO,
+            "memory": usage["memory"],
+            "disk": usage["disk"],
             "database": db_status,
-            "environment": "development"
-        }
+            "gallery_save_errors": dict(gallery_save_errors),
+            "environment": settings.ENVIRONMENT
+        })
         
     except Exception as e:
-        return {
+        return ORJSONResponse({
             "status": "unhealthy",
             "error": str(e),
             "timestamp": datetime.now().isoformat()
-        }
\ No newline at end of file
+        })
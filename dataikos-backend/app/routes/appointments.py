@@ -1,46 +1,53 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional
+from typing import Optional
 from datetime import date, datetime
 from app.models import (
-    AppointmentCreate, AppointmentInDB, AppointmentUpdate,
-    AvailableSlotResponse, TimeSlotCreate, TimeSlotInDB
+    AppointmentCreate, AppointmentUpdate,
+    AvailableSlotResponse, TimeSlotCreate
 )
 from app.auth import auth_handler
 from app.crud import crud_handler
 from app.utils.supabase_client import db_manager
+from app.utils.body import body_openapi, json_body
+from app.utils.responses import ORJSONResponse
+from app.utils.scheduler import reminder_queue
 
 router = APIRouter(prefix="/api/appointments", tags=["appointments"])
 
+def _to_slot_response(slot: dict) -> AvailableSlotResponse:
+    """Build the response for a slot row without re-validating trusted DB data"""
+    return AvailableSlotResponse.model_construct(
+        id=slot['id'],
+        date=date.fromisoformat(slot['date']),
+        start_time=slot['start_time'],
+        end_time=slot['end_time'],
+        available_spots=slot.get('available_spots', 0),
+        is_available=slot.get('is_available', False)
+    )
+
 @router.get("/available-slots")
 async def get_available_slots(
     target_date: date = Query(..., description="Date for available slots"),
+    only_available: bool = Query(False, description="Omit fully booked slots"),
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get available time slots for a specific date (admin only)"""
     try:
-        slots = await crud_handler.get_available_slots(target_date)
+        slots = await crud_handler.get_available_slots(target_date, only_available)
         
         # Format response
-        available_slots = []
-        for slot in slots:
-            available_slots.append(AvailableSlotResponse(
-                date=datetime.fromisoformat(slot['date']).date(),
-                start_time=slot['start_time'],
-                end_time=slot['end_time'],
-                available_spots=slot.get('available_spots', 0),
-                is_available=slot.get('is_available', False)
-            ))
-        
-        return available_slots
+        return [_to_slot_response(slot) for slot in slots]
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting available slots: {str(e)}"
         )
 
-@router.post("/", response_model=AppointmentInDB)
+@router.post("/", openapi_extra=body_openapi(AppointmentCreate))
 async def create_appointment(
-    appointment: AppointmentCreate,
+    appointment: AppointmentCreate = Depends(json_body(AppointmentCreate)),
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Create a new appointment (admin only)"""
@@ -53,14 +60,16 @@ async def create_appointment(
                 detail="Failed to create appointment. Time slot may be full."
             )
         
-        return created_appointment
+        return ORJSONResponse(created_appointment)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating appointment: {str(e)}"
         )
 
-@router.get("/", response_model=List[AppointmentInDB])
+@router.get("/")
 async def get_appointments(
     date_filter: Optional[date] = Query(None),
     status: Optional[str] = Query(None),
@@ -79,44 +88,49 @@ async def get_appointments(
             detail=f"Error getting appointments: {str(e)}"
         )
 
-@router.get("/{appointment_id}", response_model=AppointmentInDB)
+# Rows come straight from the database: no response_model re-validation
+@router.get("/{appointment_id}")
 async def get_appointment(
     appointment_id: str,
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get appointment by ID (admin only)"""
     try:
-        appointment = await db_manager.get_appointment(appointment_id)
+        appointment = await asyncio.to_thread(db_manager.get_appointment, appointment_id)
         if not appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Appointment not found"
             )
-        return appointment
+        return ORJSONResponse(appointment)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error getting appointment: {str(e)}"
         )
 
-@router.put("/{appointment_id}", response_model=AppointmentInDB)
+@router.put("/{appointment_id}", openapi_extra=body_openapi(AppointmentUpdate))
 async def update_appointment(
     appointment_id: str,
-    appointment_update: AppointmentUpdate,
+    appointment_update: AppointmentUpdate = Depends(json_body(AppointmentUpdate)),
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Update appointment (admin only)"""
     try:
-        update_data = appointment_update.dict(exclude_unset=True)
+        update_data = appointment_update.model_dump(exclude_unset=True)
         update_data['updated_at'] = datetime.utcnow().isoformat()
         
-        updated = await db_manager.update_appointment(appointment_id, update_data)
+        updated = await asyncio.to_thread(db_manager.update_appointment, appointment_id, update_data)
         if not updated:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Appointment not found"
             )
-        return updated
+        return ORJSONResponse(updated)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -183,47 +197,48 @@ async def get_today_appointments(
             detail=f"Error getting today's appointments: {str(e)}"
         )
 
-@router.post("/{appointment_id}/send-reminder")
+@router.post("/{appointment_id}/send-reminder", status_code=status.HTTP_202_ACCEPTED)
 async def send_appointment_reminder(
     appointment_id: str,
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
-    """Send reminder for specific appointment (admin only)"""
+    """Queue reminder for specific appointment (admin only)"""
     try:
-        appointment = await db_manager.get_appointment(appointment_id)
+        # Time slot is embedded in the same query
+        appointment = await asyncio.to_thread(db_manager.get_appointment_with_slot, appointment_id)
         if not appointment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Appointment not found"
             )
         
-        # Get time slot for appointment details
-        time_slot = await db_manager.get_time_slot(appointment['time_slot_id'])
+        time_slot = appointment.get('time_slot') or {}
         
-        # Send reminder email
-        success = email_service.send_appointment_reminder(
-            to_email=appointment['client_email'],
-            client_name=appointment['client_name'],
-            appointment_date=time_slot.get('date', 'N/A'),
-            appointment_time=time_slot.get('start_time', 'N/A'),
-            service=appointment.get('service', 'Service'),
-            price=0,  # Would need to get from order
-            notes=appointment.get('notes')
-        )
-        
-        if success:
-            # Mark reminder as sent
-            await db_manager.update_appointment(
-                appointment_id,
-                {'reminder_sent': True, 'updated_at': datetime.utcnow().isoformat()}
+        # The reminder worker sends it and sets reminder_sent
+        queued = await reminder_queue.put(appointment_id, {
+            'to_email': appointment['client_email'],
+            'client_name': appointment['client_name'],
+            'appointment_date': time_slot.get('date', 'N/A'),
+            'appointment_time': time_slot.get('start_time', 'N/A'),
+            'service': appointment.get('service', 'Service'),
+            'price': 0,  # Would need to get from order
+            'notes': appointment.get('notes')
+        })
+        if not queued:
+            # Still waiting in the queue or sent but not yet flagged
+            return ORJSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={"success": True, "message": "Reminder already queued"}
             )
             
         return {
-            "success": success,
-            "message": "Reminder sent successfully" if success else "Failed to send reminder"
+            "success": True,
+            "message": "Reminder queued"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error sending reminder: {str(e)}"
-        )
\ No newline at end of file
+        )
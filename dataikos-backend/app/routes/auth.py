@@ -1,18 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from typing import Any, Dict, Tuple
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 
 from app.schemas import LoginRequest, TokenResponse, RefreshTokenRequest
 from app.auth import auth_handler
 from app.config import settings
+from app.utils.body import body_openapi, json_body
+from app.utils.cache import TTLCache
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
+# Pre-serialized (/me, /validate-token) payloads per user id; same TTL as the user cache
+_profile_cache = TTLCache(maxsize=1024, ttl=30.0)
+
+
+def _profile_payloads(user: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """Return the cached JSON bodies for /me and /validate-token"""
+    payloads = _profile_cache.get(user["id"])
+    if payloads is None:
+        me = orjson.dumps({
+            "id": user["id"],
+            "username": user["username"],
+            "email": user.get("email"),
+            "is_admin": user.get("is_admin", False),
+            "is_active": user.get("is_active", True),
+            "created_at": user.get("created_at")
+        })
+        validate = orjson.dumps({
+            "valid": True,
+            "user": {
+                "id": user["id"],
+                "username": user["username"],
+                "email": user.get("email"),
+                "is_admin": user.get("is_admin", False)
+            }
+        })
+        payloads = (me, validate)
+        _profile_cache.set(user["id"], payloads)
+    return payloads
+
 
-@router.post("/login", response_model=TokenResponse)
-async def login(credentials: LoginRequest):
+@router.post("/login", response_model=TokenResponse, openapi_extra=body_openapi(LoginRequest))
+async def login(credentials: LoginRequest = Depends(json_body(LoginRequest))):
     """Login user and return JWT tokens"""
     user = await auth_handler.authenticate_user(
         credentials.username,
@@ -37,6 +70,7 @@ async def login(credentials: LoginRequest):
 async def logout(current_user: dict = Depends(auth_handler.get_current_user)):
     """Logout user (client-side token deletion)"""
     logger.info(f"User logged out: {current_user['username']}")
+    _profile_cache.pop(current_user["id"])
     
     return {"message": "Successfully logged out"}
 
@@ -59,25 +93,10 @@ async def refresh_token(request: RefreshTokenRequest):
 @router.get("/validate-token")
 async def validate_token(current_user: dict = Depends(auth_handler.get_current_user)):
     """Validate current access token"""
-    return {
-        "valid": True,
-        "user": {
-            "id": current_user["id"],
-            "username": current_user["username"],
-            "email": current_user.get("email"),
-            "is_admin": current_user.get("is_admin", False)
-        }
-    }
+    return Response(content=_profile_payloads(current_user)[1], media_type="application/json")
 
 
 @router.get("/me")
 async def get_current_user_info(current_user: dict = Depends(auth_handler.get_current_user)):
     """Get current user information"""
-    return {
-        "id": current_user["id"],
-        "username": current_user["username"],
-        "email": current_user.get("email"),
-        "is_admin": current_user.get("is_admin", False),
-        "is_active": current_user.get("is_active", True),
-        "created_at": current_user.get("created_at")
-    }
+    return Response(content=_profile_payloads(current_user)[0], media_type="application/json")
@@ -1,83 +1,224 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
-from fastapi.responses import JSONResponse
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Tuple
+import asyncio
+import contextlib
+import functools
+import logging
+import multiprocessing
 import os
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import uuid
 from PIL import Image
-import io
-from app.models import GalleryItemCreate, GalleryItemInDB
+from app.models import GalleryItemCreate
 from app.auth import auth_handler
 from app.crud import crud_handler
 from app.config import settings
 from app.utils.supabase_client import db_manager
+from app.utils.pagination import Cursor, cursor_param, paged_response
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/gallery", tags=["gallery"])
 
-ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+ALLOWED_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'gif', 'webp'})
+ALLOWED_CONTENT_TYPES = frozenset({'image/jpeg', 'image/png', 'image/gif', 'image/webp'})
+MAX_FILE_SIZE = settings.MAX_FILE_SIZE_MB * 1024 * 1024
 
-def allowed_file(filename: str) -> bool:
-    """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Workers start lazily, once the server already runs threads (anyio, asyncio.to_thread):
+# never fork() it. A forkserver (spawn on Windows) imports this module once and
+# forks the workers from that clean single-threaded process.
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _POOL_CONTEXT = multiprocessing.get_context("forkserver")
+    _POOL_CONTEXT.set_forkserver_preload([__name__])
+else:
+    _POOL_CONTEXT = multiprocessing.get_context("spawn")
 
-def save_image(file: UploadFile) -> Optional[str]:
-    """Save uploaded image and return filename"""
-    try:
-        # Generate unique filename
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
-        unique_filename = f"{uuid.uuid4()}.{file_extension}"
-        
-        # Create uploads directory if it doesn't exist
-        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-        
-        # Read and compress image if needed
-        image_data = file.file.read()
-        img = Image.open(io.BytesIO(image_data))
-        
-        # Convert to RGB if necessary
-        if img.mode in ('RGBA', 'LA'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[-1])
-            img = background
-        
-        # Resize if too large (max 2000px on largest side)
-        max_size = 2000
-        if max(img.size) > max_size:
-            ratio = max_size / max(img.size)
-            new_size = tuple(int(dim * ratio) for dim in img.size)
-            img = img.resize(new_size, Image.Resampling.LANCZOS)
-        
-        # Save compressed image
-        img.save(file_path, 'JPEG' if file_extension == 'jpg' else file_extension.upper(), 
-                quality=85, optimize=True)
-        
-        return unique_filename
-    except Exception as e:
-        print(f"Error saving image: {e}")
-        return None
+# Pillow decode/resize/encode is CPU-bound: keep it off the event loop and the GIL
+IMAGE_POOL = ProcessPoolExecutor(max_workers=os.cpu_count(), mp_context=_POOL_CONTEXT)
+# Caps images in flight across requests
+_image_slots = asyncio.Semaphore(16)
+# Files of a single bulk upload processed at once
+BULK_UPLOAD_CONCURRENCY = min(8, os.cpu_count() or 1)
+COPY_BUFFER_SIZE = 64 * 1024
+THUMBNAIL_SIZE = (256, 256)
+# Public prefix of stored images
+UPLOADS_URL = f"{settings.FRONTEND_URL}/uploads/"
+# Failed image saves by exception type, reported by /api/admin/system/health
+save_errors: Counter = Counter()
+
+@functools.lru_cache(maxsize=1024)
+def allowed_file(extension: str) -> bool:
+    """Check an extension as returned by os.path.splitext (memoized: uploads repeat a handful of spellings)"""
+    return extension[1:].lower() in ALLOWED_EXTENSIONS
+
+def _webp_name(filename: str) -> str:
+    """Name of the WebP variant stored next to an image"""
+    return f"{os.path.splitext(filename)[0]}.webp"
+
+def _thumb_name(filename: str) -> str:
+    """Name of the list-view thumbnail stored next to an image"""
+    return f"{os.path.splitext(filename)[0]}_thumb.jpg"
+
+def _save_thumbnail(img: Image.Image, filename: str):
+    """Write the 256px thumbnail of img (modified in place)"""
+    img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    img.save(
+        os.path.join(settings.UPLOAD_DIR, _thumb_name(filename)),
+        'JPEG', quality=78, optimize=True, progressive=True
+    )
+
+# JPEG info keys of metadata that must not be republished (location, camera serial...)
+_JPEG_METADATA_KEYS = frozenset({'exif', 'icc_profile', 'comment', 'xmp', 'photoshop'})
+
+def _is_clean_jpeg(img: Image.Image, source_path: str) -> bool:
+    """True when a JPEG has no metadata segments and no bytes after its end marker"""
+    if _JPEG_METADATA_KEYS & img.info.keys():
+        return False
+    with Image.open(source_path) as probe:
+        probe.verify()
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    # Entropy-coded data never contains FF D9, so the first one must be the last two bytes
+    return data.find(b'\xff\xd9') == len(data) - 2
+
+def _compress_image(source_path: str) -> Tuple[str, Optional[str]]:
+    """Compress an image file into the uploads directory.
+
+    Returns the filename and the name of its WebP variant (None when none
+    was written), so the row can record it.
+
+    Whatever the source format, the image is stored as a progressive JPEG
+    plus a WebP variant with the same name; RGB JPEGs already within the
+    size cap, without metadata or trailing bytes, are moved into place
+    untouched (no WebP variant). A 256px
+    thumbnail is written in both cases. Runs in
+    IMAGE_POOL, so it only takes picklable arguments; errors propagate to
+    save_image.
+    """
+    # Generate unique filename
+    unique_filename = f"{uuid.uuid4().hex}.jpg"
+    
+    # Save file
+    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
+    
+    # Pillow reads the spooled upload straight from disk
+    img = Image.open(source_path)
+    
+    # Target size: max 2000px on largest side
+    max_size = 2000
+    
+    # Already a small, clean RGB JPEG: keep the uploaded bytes, skip the full decode/encode
+    if (
+        img.format == 'JPEG' and img.mode == 'RGB' and max(img.size) <= max_size
+        and _is_clean_jpeg(img, source_path)
+    ):
+        # thumbnail() decodes at reduced DCT scale, so this stays cheap
+        _save_thumbnail(img, unique_filename)
+        img.close()
+        os.replace(source_path, file_path)
+        return unique_filename, None
+    
+    new_size = None
+    if max(img.size) > max_size:
+        ratio = max_size / max(img.size)
+        new_size = tuple(int(dim * ratio) for dim in img.size)
+        # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale, never below new_size
+        img.draft(img.mode, new_size)
+    
+    # Flatten transparency on white, JPEG has no alpha
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    
+    # Resize if too large (LANCZOS finishes what the draft scaling left)
+    if new_size and img.size != new_size:
+        img = img.resize(new_size, Image.Resampling.LANCZOS)
+    
+    # Save compressed image, and a smaller WebP for browsers that take it
+    img.save(file_path, 'JPEG', quality=85, optimize=True, progressive=True)
+    img.save(
+        os.path.join(settings.UPLOAD_DIR, _webp_name(unique_filename)),
+        'WEBP', quality=80, method=4
+    )
+    # Thumbnail from the already decoded and resized pixels
+    _save_thumbnail(img.copy(), unique_filename)
+    
+    return unique_filename, _webp_name(unique_filename)
+
+def _remove_image(filename: str):
+    """Delete an uploaded image, its WebP variant and thumbnail (failures are logged, not raised)"""
+    for name in (filename, _webp_name(filename), _thumb_name(filename)):
+        try:
+            os.remove(os.path.join(settings.UPLOAD_DIR, name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Failed to delete image file %s: %s", name, e)
+
+def _with_urls(item: dict) -> dict:
+    """Copy of a gallery row with full image URLs (webp_url when a variant was stored)"""
+    filename = item.get('image_url')
+    if not filename or filename[:4] == 'http':
+        return item
+    
+    urls = {'image_url': UPLOADS_URL + filename}
+    thumbnail = item.get('thumbnail_url')
+    if thumbnail and thumbnail[:4] != 'http':
+        urls['thumbnail_url'] = UPLOADS_URL + thumbnail
+    webp = item.get('webp_url')
+    if webp and webp[:4] != 'http':
+        urls['webp_url'] = UPLOADS_URL + webp
+    return {**item, **urls}
+
+def _spool_to_disk(source: BinaryIO, path: str):
+    """Copy an upload to path in 64 KB chunks"""
+    source.seek(0)
+    with open(path, 'wb') as out:
+        shutil.copyfileobj(source, out, length=COPY_BUFFER_SIZE)
+
+async def save_image(file: UploadFile) -> Optional[Tuple[str, Optional[str]]]:
+    """Save uploaded image in the process pool and return (filename, webp filename)"""
+    # Hand the worker a path rather than the whole file through a pipe
+    source_path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}.upload")
+    async with _image_slots:
+        try:
+            await asyncio.to_thread(_spool_to_disk, file.file, source_path)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                IMAGE_POOL, _compress_image, source_path
+            )
+        except Exception as e:
+            # Worker exceptions are re-raised here, in the parent process
+            save_errors[type(e).__name__] += 1
+            logger.exception("save_image failed for %s", file.filename)
+            return None
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(source_path)
 
-@router.get("/", response_model=List[GalleryItemInDB])
+@router.get("/")
 async def get_gallery_items(
     category: Optional[str] = Query(None),
     limit: int = Query(100, ge=1, le=1000),
-    skip: int = Query(0, ge=0)
+    skip: int = Query(0, ge=0),
+    after: Optional[Cursor] = Depends(cursor_param)
 ):
     """Get gallery items with optional category filter"""
     items = await crud_handler.get_gallery_items(
         skip=skip,
         limit=limit,
-        category=category
+        category=category,
+        after=after
     )
     
-    # Add full URL to images
-    for item in items:
-        if item.get('image_url') and not item['image_url'].startswith('http'):
-            item['image_url'] = f"{settings.FRONTEND_URL}/uploads/{item['image_url']}"
-    
-    return items
+    # Add full URL to images (copies: the rows are shared with the cache)
+    return paged_response([_with_urls(item) for item in items], limit)
 
 @router.post("/upload")
 async def upload_image(
@@ -88,48 +229,45 @@ async def upload_image(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Upload image to gallery (admin only)"""
-    # Check file size
-    file.file.seek(0, 2)  # Seek to end
-    file_size = file.file.tell()
-    file.file.seek(0)  # Seek back to start
-    
-    if file_size > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
+    # Cheapest checks first: extension and declared type, then size
+    extension = os.path.splitext(file.filename)[1]
+    if not allowed_file(extension) or file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Max size is {settings.MAX_FILE_SIZE_MB}MB"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
-    # Check file extension
-    if not allowed_file(file.filename):
+    # Check file size (counted by the multipart parser)
+    if file.size > MAX_FILE_SIZE:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Max size is {settings.MAX_FILE_SIZE_MB}MB"
         )
     
     # Save image
-    filename = save_image(file)
-    if not filename:
+    saved = await save_image(file)
+    if not saved:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to save image"
         )
+    filename, webp = saved
     
     # Create gallery item in database
     gallery_item = GalleryItemCreate(
         title=title,
         category=category,
         description=description,
-        image_url=filename
+        image_url=filename,
+        thumbnail_url=_thumb_name(filename),
+        webp_url=webp
     )
     
     created_item = await crud_handler.create_gallery_item(gallery_item)
     
     if not created_item:
         # Delete uploaded file if database save failed
-        try:
-            os.remove(os.path.join(settings.UPLOAD_DIR, filename))
-        except:
-            pass
+        _remove_image(filename)
         
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -137,9 +275,7 @@ async def upload_image(
         )
     
     # Add full URL to response
-    created_item['image_url'] = f"{settings.FRONTEND_URL}/uploads/{filename}"
-    
-    return created_item
+    return _with_urls(created_item)
 
 @router.delete("/{item_id}")
 async def delete_gallery_item(
@@ -148,8 +284,7 @@ async def delete_gallery_item(
 ):
     """Delete gallery item (admin only)"""
     # First get item to get filename
-    items = await crud_handler.get_gallery_items()
-    item = next((i for i in items if i.get('id') == item_id), None)
+    item = await asyncio.to_thread(db_manager.get_gallery_item, item_id)
     
     if not item:
         raise HTTPException(
@@ -169,28 +304,60 @@ async def delete_gallery_item(
     # Delete image file
     if item.get('image_url'):
         filename = item['image_url'].split('/')[-1]
-        file_path = os.path.join(settings.UPLOAD_DIR, filename)
-        
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            print(f"Warning: Failed to delete image file: {e}")
+        _remove_image(filename)
     
     return {"message": "Gallery item deleted successfully"}
 
 @router.get("/categories")
 async def get_gallery_categories():
     """Get list of gallery categories"""
-    items = await crud_handler.get_gallery_items()
+    categories = await asyncio.to_thread(db_manager.get_gallery_categories)
     
-    # Extract unique categories
-    categories = set()
-    for item in items:
-        if item.get('category'):
-            categories.add(item['category'])
+    return {"categories": categories}
+
+async def _bulk_upload_one(
+    file: UploadFile,
+    category: str,
+    slots: asyncio.Semaphore
+) -> Tuple[Optional[dict], Optional[str]]:
+    """Validate, save and record one file of a bulk upload: (item, error)"""
+    # Filename parsed once: title from the stem, check on the extension
+    title, extension = os.path.splitext(file.filename)
     
-    return {"categories": list(categories)}
+    # Cheapest checks first: extension and declared type, then size
+    if not allowed_file(extension) or file.content_type not in ALLOWED_CONTENT_TYPES:
+        return None, "File type not allowed"
+    
+    # Check file size (counted by the multipart parser)
+    if file.size > MAX_FILE_SIZE:
+        return None, f"File too large (> {settings.MAX_FILE_SIZE_MB}MB)"
+    
+    async with slots:
+        # Save image
+        saved = await save_image(file)
+        if not saved:
+            return None, "Failed to save image"
+        filename, webp = saved
+        
+        # Create gallery item
+        gallery_item = GalleryItemCreate(
+            title=title,
+            category=category,
+            description=None,
+            image_url=filename,
+            thumbnail_url=_thumb_name(filename),
+            webp_url=webp
+        )
+        
+        created_item = await crud_handler.create_gallery_item(gallery_item)
+    
+    if not created_item:
+        # Delete file if database save failed
+        _remove_image(filename)
+        
+        return None, "Failed to save to database"
+    
+    return _with_urls(created_item), None
 
 @router.post("/bulk-upload")
 async def bulk_upload_images(
@@ -202,71 +369,32 @@ async def bulk_upload_images(
     uploaded_items = []
     failed_items = []
     
-    for file in files:
-        try:
-            # Check file size
-            file.file.seek(0, 2)
-            file_size = file.file.tell()
-            file.file.seek(0)
-            
-            if file_size > settings.MAX_FILE_SIZE_MB * 1024 * 1024:
-                failed_items.append({
-                    "filename": file.filename,
-                    "error": f"File too large (> {settings.MAX_FILE_SIZE_MB}MB)"
-                })
-                continue
-            
-            # Check file extension
-            if not allowed_file(file.filename):
-                failed_items.append({
-                    "filename": file.filename,
-                    "error": "File type not allowed"
-                })
-                continue
-            
-            # Save image
-            filename = save_image(file)
-            if not filename:
-                failed_items.append({
-                    "filename": file.filename,
-                    "error": "Failed to save image"
-                })
-                continue
-            
-            # Create gallery item
-            title = file.filename.rsplit('.', 1)[0]
-            gallery_item = GalleryItemCreate(
-                title=title,
-                category=category,
-                description=None,
-                image_url=filename
-            )
-            
-            created_item = await crud_handler.create_gallery_item(gallery_item)
-            
-            if created_item:
-                created_item['image_url'] = f"{settings.FRONTEND_URL}/uploads/{filename}"
-                uploaded_items.append(created_item)
-            else:
-                # Delete file if database save failed
-                try:
-                    os.remove(os.path.join(settings.UPLOAD_DIR, filename))
-                except:
-                    pass
-                
-                failed_items.append({
-                    "filename": file.filename,
-                    "error": "Failed to save to database"
-                })
-                
-        except Exception as e:
+    # Files of one request are processed concurrently, a few at a time
+    slots = asyncio.Semaphore(BULK_UPLOAD_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_bulk_upload_one(file, category, slots) for file in files),
+        return_exceptions=True
+    )
+    
+    for file, result in zip(files, results):
+        if isinstance(result, Exception):
+            failed_items.append({
+                "filename": file.filename,
+                "error": str(result)
+            })
+            continue
+        
+        created_item, error = result
+        if error:
             failed_items.append({
                 "filename": file.filename,
-                "error": str(e)
+                "error": error
             })
+        else:
+            uploaded_items.append(created_item)
     
     return {
         "message": f"Uploaded {len(uploaded_items)} of {len(files)} images",
         "uploaded": uploaded_items,
         "failed": failed_items
-    }
\ No newline at end of file
+    }
@@ -1,13 +1,17 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from typing import List, Optional
-from app.models import MessageCreate, MessageInDB, MessageUpdate
+from typing import Optional
+from app.models import MessageCreate, MessageUpdate
 from app.schemas import MessageFilter, PaginationParams
 from app.auth import auth_handler
 from app.crud import crud_handler
+from app.utils.supabase_client import db_manager
+from app.utils.pagination import Cursor, cursor_param, paged_response
 
 router = APIRouter(prefix="/api/messages", tags=["messages"])
 
-@router.post("/", response_model=MessageInDB)
+@router.post("/")
 async def create_message(message: MessageCreate):
     """Create a new contact message"""
     created_message = await crud_handler.create_message(message)
@@ -20,31 +24,30 @@ async def create_message(message: MessageCreate):
     
     return created_message
 
-@router.get("/", response_model=List[MessageInDB])
+@router.get("/")
 async def get_messages(
     pagination: PaginationParams = Depends(),
     status: Optional[str] = Query(None),
+    after: Optional[Cursor] = Depends(cursor_param),
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get all messages (admin only)"""
     messages = await crud_handler.get_messages(
         skip=(pagination.page - 1) * pagination.limit,
         limit=pagination.limit,
-        status=status
+        status=status,
+        after=after
     )
     
-    return messages
+    return paged_response(messages, pagination.limit)
 
-@router.get("/{message_id}", response_model=MessageInDB)
+@router.get("/{message_id}")
 async def get_message(
     message_id: str,
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
     """Get message by ID (admin only)"""
-    # In Supabase, we need to implement get_message_by_id
-    # For now, we'll filter from all messages
-    messages = await crud_handler.get_messages()
-    message = next((m for m in messages if m.get('id') == message_id), None)
+    message = await crud_handler.get_message_by_id(message_id)
     
     if not message:
         raise HTTPException(
@@ -89,31 +92,17 @@ async def get_messages_summary(
 ):
     """Get messages summary statistics (admin only)"""
     try:
-        messages = await crud_handler.get_messages()
-        
-        if not messages:
-            return {
-                "total": 0,
-                "unread": 0,
-                "read": 0,
-                "today": 0
-            }
-        
-        total = len(messages)
-        unread = sum(1 for m in messages if m.get('status') == 'unread')
-        read = total - unread
+        # One row per status, aggregated by the database
+        stats = await asyncio.to_thread(db_manager.get_messages_stats)
         
-        # Count messages from today
-        from datetime import datetime, timezone
-        today = datetime.now(timezone.utc).date()
-        today_count = sum(1 for m in messages 
-                         if datetime.fromisoformat(m.get('created_at', '')).date() == today)
+        total = sum(row["count"] for row in stats)
+        unread = sum(row["count"] for row in stats if row["status"] == "unread")
         
         return {
             "total": total,
             "unread": unread,
-            "read": read,
-            "today": today_count
+            "read": total - unread,
+            "today": sum(row["today"] for row in stats)
         }
     except Exception as e:
         raise HTTPException(
@@ -1,26 +1,33 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
-from datetime import date
+from datetime import date, datetime
 
-from app.models import OrderCreate, OrderInDB, OrderUpdate
+from app.models import OrderCreate, OrderUpdate
 from app.schemas import PaginationParams
 from app.auth import auth_handler
+from app.crud import crud_handler
 from app.utils.supabase_client import db_manager
+from app.utils.pagination import Cursor, cursor_param, paged_response
 
 router = APIRouter(prefix="/api/orders", tags=["orders"])
 
+# Ids per UPDATE: the IN (...) filter travels in the query string
+BULK_UPDATE_CHUNK_SIZE = 200
+
 
 # =========================
 # CREATE ORDER
 # =========================
 
-@router.post("/", response_model=OrderInDB)
-def create_order(order: OrderCreate):
+@router.post("/")
+async def create_order(order: OrderCreate):
     """Create a new order with optional appointment"""
 
     # Validate time slot if provided
     if order.time_slot_id:
-        time_slot = db_manager.get_time_slot(order.time_slot_id)
+        time_slot = await db_manager.aget_time_slot(order.time_slot_id)
 
         if not time_slot:
             raise HTTPException(
@@ -39,7 +46,7 @@ def create_order(order: OrderCreate):
                 detail="Time slot is fully booked"
             )
 
-    created = db_manager.create_order(order.model_dump())
+    created = await crud_handler.create_order(order)
 
     if not created:
         raise HTTPException(
@@ -55,48 +62,41 @@ def create_order(order: OrderCreate):
 # =========================
 
 @router.get("/available-slots")
-def get_available_slots(
+async def get_available_slots(
     target_date: date = Query(..., description="Date for available slots")
 ):
     """Get available time slots for a specific date"""
-
-    slots = db_manager.get_available_slots(target_date)
-
-    return [
-        {
-            "id": s["id"],
-            "date": s["date"],
-            "start_time": s["start_time"],
-            "end_time": s["end_time"],
-            "available_spots": s["available_spots"],
-            "is_available": s["is_available"]
-        }
-        for s in slots if s["is_available"]
-    ]
+    # The view already drops fully booked slots and computes availability
+    return await db_manager.aget_available_slots(target_date, True)
 
 
 # =========================
 # GET ORDERS (ADMIN)
 # =========================
 
-@router.get("/", response_model=List[OrderInDB])
+@router.get("/")
 def get_orders(
     pagination: PaginationParams = Depends(),
     status_filter: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None, description="Only orders created at or after"),
+    after: Optional[Cursor] = Depends(cursor_param),
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
-    return db_manager.get_orders(
+    # page is only honoured without a cursor (admin UI page links)
+    return paged_response(db_manager.get_orders(
         filters={"status": status_filter},
         limit=pagination.limit,
-        offset=(pagination.page - 1) * pagination.limit
-    )
+        offset=(pagination.page - 1) * pagination.limit,
+        since=since,
+        after=after
+    ), pagination.limit)
 
 
 # =========================
 # GET ORDER BY ID (ADMIN)
 # =========================
 
-@router.get("/{order_id}", response_model=OrderInDB)
+@router.get("/{order_id}")
 def get_order(
     order_id: str,
     current_user: dict = Depends(auth_handler.get_current_admin)
@@ -116,7 +116,7 @@ def get_order(
 # UPDATE ORDER (ADMIN)
 # =========================
 
-@router.put("/{order_id}", response_model=OrderInDB)
+@router.put("/{order_id}")
 def update_order(
     order_id: str,
     order_update: OrderUpdate,
@@ -164,20 +164,36 @@ def delete_order(
 def get_orders_summary(
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
-    orders = db_manager.get_orders(limit=10_000)
+    # One row per status, aggregated by the database
+    stats = {row["status"]: row for row in db_manager.get_orders_stats()}
 
-    total = len(orders)
-    pending = sum(o["status"] == "pending" for o in orders)
-    completed = sum(o["status"] == "completed" for o in orders)
-    cancelled = sum(o["status"] == "cancelled" for o in orders)
-    revenue = sum(o.get("price", 0) for o in orders if o["status"] == "completed")
+    def count(status: str) -> int:
+        return stats.get(status, {}).get("count", 0)
 
     return {
-        "total": total,
-        "pending": pending,
-        "completed": completed,
-        "cancelled": cancelled,
-        "revenue": revenue
+        "total": sum(row["count"] for row in stats.values()),
+        "pending": count("pending"),
+        "completed": count("completed"),
+        "cancelled": count("cancelled"),
+        "revenue": stats.get("completed", {}).get("revenue", 0)
+    }
+
+
+# =========================
+# BULK CREATE (ADMIN)
+# =========================
+
+@router.post("/bulk-create")
+async def bulk_create_orders(
+    orders: List[OrderCreate],
+    current_user: dict = Depends(auth_handler.get_current_admin)
+):
+    # Multi-row INSERTs of BULK_INSERT_CHUNK_SIZE rows instead of one request per order
+    created = await crud_handler.bulk_create_orders(orders)
+
+    return {
+        "created": created,
+        "total": len(orders)
     }
 
 
@@ -186,18 +202,22 @@ def get_orders_summary(
 # =========================
 
 @router.post("/bulk-update")
-def bulk_update_orders(
+async def bulk_update_orders(
     order_ids: List[str],
     status: str,
     current_user: dict = Depends(auth_handler.get_current_admin)
 ):
-    updated = 0
-
-    for oid in order_ids:
-        if db_manager.update_order(oid, {"status": status}):
-            updated += 1
+    # One UPDATE ... WHERE id IN (...) per chunk, chunks sent concurrently
+    chunks = [
+        order_ids[i:i + BULK_UPDATE_CHUNK_SIZE]
+        for i in range(0, len(order_ids), BULK_UPDATE_CHUNK_SIZE)
+    ]
+    counts = await asyncio.gather(*(
+        asyncio.to_thread(db_manager.bulk_update_orders, chunk, status)
+        for chunk in chunks
+    ))
 
     return {
-        "updated": updated,
+        "updated": sum(counts),
         "total": len(order_ids)
     }
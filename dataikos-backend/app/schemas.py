@@ -2,6 +2,9 @@ from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List
 import re
 
+# Cameroon phone numbers + international
+_PHONE_RE = re.compile(r'^(\+?237)?[6-9][0-9]{8}$|^\+?[0-9]{10,15}$')
+
 
 class LoginRequest(BaseModel):
     """Login request schema"""
@@ -109,10 +112,8 @@ class PhoneValidator(BaseModel):
     
     @validator('phone')
     def validate_phone(cls, v):
-        # Cameroon phone numbers + international
-        phone_pattern = r'^(\+?237)?[6-9][0-9]{8}$|^\+?[0-9]{10,15}$'
         clean_phone = v.replace(' ', '').replace('-', '')
-        if not re.match(phone_pattern, clean_phone):
+        if not _PHONE_RE.match(clean_phone):
             raise ValueError('Invalid phone number format')
         return clean_phone
 
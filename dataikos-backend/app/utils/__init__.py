@@ -3,23 +3,28 @@ Utility modules for DATAIKOŠ Backend
 """
 
 from app.utils.security import (
+    check_password,
     verify_password,
     get_password_hash,
     create_access_token,
     create_refresh_token,
-    verify_token
+    verify_token,
+    verify_token_cached
 )
 from app.utils.supabase_client import db_manager
 from app.utils.email_service import email_service
-from app.utils.scheduler import scheduler
+from app.utils.scheduler import reminder_queue, scheduler
 
 __all__ = [
+    'check_password',
     'verify_password',
     'get_password_hash',
     'create_access_token',
     'create_refresh_token',
     'verify_token',
+    'verify_token_cached',
     'db_manager',
     'email_service',
-    'scheduler'
+    'scheduler',
+    'reminder_queue'
 ]
@@ -0,0 +1,32 @@
+from typing import Any, Callable, Dict, Type, TypeVar
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def json_body(model: Type[ModelT]) -> Callable[[Request], Any]:
+    """Dependency parsing the raw body with model_validate_json (one pass, no json.loads)"""
+
+    async def parse(request: Request) -> ModelT:
+        try:
+            return model.model_validate_json(await request.body())
+        except ValidationError as e:
+            # Same 422 payload as FastAPI's built-in body handling
+            raise RequestValidationError(
+                [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)]
+            )
+
+    return parse
+
+
+def body_openapi(model: Type[BaseModel]) -> Dict[str, Any]:
+    """openapi_extra documenting a body read through json_body"""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+        }
+    }
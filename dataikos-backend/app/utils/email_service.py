@@ -1,135 +1,210 @@
+import asyncio
 import smtplib
 import logging
+import threading
+import time
+from functools import lru_cache
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Dict, Any, Optional, List
+from email.message import Message
+from typing import Dict, Any, Optional, List, Tuple
 import jinja2
+import re
+from markupsafe import escape
 import os
+import tempfile
 from pathlib import Path
 
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Reconnect instead of trusting a connection idle for longer than this
+SMTP_IDLE_TIMEOUT = 60.0
+
+# Emails waiting for the background sender before enqueue starts refusing
+EMAIL_QUEUE_SIZE = 1000
+
+
+# Fields of the appointment email templates; notes is the only conditional one
+APPOINTMENT_FIELDS = ("client_name", "appointment_date", "appointment_time", "service", "price", "notes")
+_SENTINEL_RE = re.compile(r"\x00(\w+)\x00")
+
+
+class FlatTemplate:
+    """
+    Jinja template flattened into literal chunks and field slots.
+    Rendered once at startup with sentinel values (with and without the
+    optional field), then filled by plain string joins: same HTML, no Jinja
+    context per message. Only for templates whose fields are printed as-is.
+    """
+    
+    def __init__(self, template: jinja2.Template, fields: Tuple[str, ...], optional: str):
+        self.optional = optional
+        sentinels = {name: f"\x00{name}\x00" for name in fields}
+        self._with = self._split(template.render(**sentinels))
+        self._without = self._split(template.render(**{**sentinels, optional: None}))
+    
+    @staticmethod
+    def _split(rendered: str) -> List[str]:
+        """Literal chunks at even indexes, field names at odd indexes"""
+        return _SENTINEL_RE.split(rendered)
+    
+    def render(self, **context: Any) -> str:
+        """Fill the slots with autoescaped values, as Jinja would"""
+        parts = list(self._with if context.get(self.optional) else self._without)
+        for i in range(1, len(parts), 2):
+            parts[i] = escape(context.get(parts[i]))
+        return "".join(parts)
+
+
+@lru_cache(maxsize=512)
+def _render(template: FlatTemplate, **context: Any) -> str:
+    """Render a template, reusing the HTML of an identical earlier context"""
+    return template.render(**context)
+
+
 class EmailService:
     """Service for sending emails"""
     
+    CONFIRMATION_SUBJECT = "Confirmation de rendez-vous - {}"
+    REMINDER_SUBJECT = "Rappel de rendez-vous - {}"
+    
     def __init__(self):
-        self.templates_dir = Path("app/templates/email")
-        self.templates_dir.mkdir(parents=True, exist_ok=True)
+        # Idle authenticated SMTP connections (connection, last used), reused across sends
+        self._smtp_idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._smtp_lock = threading.Lock()
+        
+        # Outgoing emails, sent by run_worker off the request path
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=EMAIL_QUEUE_SIZE)
         
-        # Create default templates if they don't exist
-        self._create_default_templates()
+        self.refresh_settings()
+        
+        # Templates ship with the app under app/templates/email
+        self.templates_dir = Path(__file__).resolve().parent.parent / "templates" / "email"
+        
+        # Compiled template bytecode survives worker restarts
+        cache_dir = Path(tempfile.gettempdir()) / "dataikos_jinja_cache"
+        cache_dir.mkdir(exist_ok=True)
         
         # Setup Jinja2 environment
         self.jinja_env = jinja2.Environment(
             loader=jinja2.FileSystemLoader(str(self.templates_dir)),
-            autoescape=jinja2.select_autoescape(['html', 'xml'])
+            bytecode_cache=jinja2.FileSystemBytecodeCache(str(cache_dir)),
+            autoescape=jinja2.select_autoescape(['html', 'xml']),
+            cache_size=-1  # Never evict compiled templates
+        )
+        
+        # Resolve templates once instead of on every send
+        self._confirmation_tpl = FlatTemplate(
+            self.jinja_env.get_template("appointment_confirmation.html"),
+            APPOINTMENT_FIELDS,
+            optional="notes"
+        )
+        self._reminder_tpl = FlatTemplate(
+            self.jinja_env.get_template("appointment_reminder.html"),
+            APPOINTMENT_FIELDS,
+            optional="notes"
         )
     
-    def _create_default_templates(self):
-        """Create default email templates"""
-        templates = {
-            "appointment_confirmation.html": """
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <style>
-        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
-        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-        .header { background: #4F46E5; color: white; padding: 20px; text-align: center; border-radius: 5px; }
-        .content { background: #f9f9f9; padding: 20px; border-radius: 5px; margin-top: 20px; }
-        .appointment-details { background: white; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 4px solid #4F46E5; }
-        .footer { text-align: center; margin-top: 30px; color: #666; font-size: 12px; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>Confirmation de rendez-vous</h1>
-        </div>
-        <div class="content">
-            <p>Bonjour {{ client_name }},</p>
-            <p>Votre rendez-vous a été confirmé avec succès.</p>
-            
-            <div class="appointment-details">
-                <h3>Détails du rendez-vous :</h3>
-                <p><strong>Service :</strong> {{ service }}</p>
-                <p><strong>Date :</strong> {{ appointment_date }}</p>
-                <p><strong>Heure :</strong> {{ appointment_time }}</p>
-                <p><strong>Prix :</strong> {{ price }} XAF</p>
-                {% if notes %}
-                <p><strong>Notes :</strong> {{ notes }}</p>
-                {% endif %}
-            </div>
-            
-            <p>Un rappel vous sera envoyé 24h avant votre rendez-vous.</p>
-            <p>Pour modifier ou annuler votre rendez-vous, veuillez nous contacter.</p>
-        </div>
-        <div class="footer">
-            <p>© 2024 DATAIKÔS. Tous droits réservés.</p>
-            <p>Email : contact@dataikos.com | Tél : +237 6XX XX XX XX</p>
-        </div>
-    </div>
-</body>
-</html>
-            """,
-            "appointment_reminder.html": """
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="utf-8">
-    <style>
-        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
-        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
-        .header { background: #10B981; color: white; padding: 20px; text-align: center; border-radius: 5px; }
-        .content { background: #f9f9f9; padding: 20px; border-radius: 5px; margin-top: 20px; }
-        .appointment-details { background: white; padding: 15px; border-radius: 5px; margin: 15px 0; border-left: 4px solid #10B981; }
-        .footer { text-align: center; margin-top: 30px; color: #666; font-size: 12px; }
-        .reminder-note { background: #FEF3C7; padding: 10px; border-radius: 5px; margin: 10px 0; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>Rappel de rendez-vous</h1>
-        </div>
-        <div class="content">
-            <p>Bonjour {{ client_name }},</p>
-            <p>Ceci est un rappel pour votre rendez-vous prévu demain.</p>
-            
-            <div class="reminder-note">
-                <p>💡 <strong>N'oubliez pas :</strong> Votre rendez-vous est dans 24h.</p>
-            </div>
+    def refresh_settings(self):
+        """Snapshot the email settings read on every send (call again after reloading settings)"""
+        self._enabled = settings.EMAIL_ENABLED
+        self._smtp_host = settings.SMTP_HOST
+        self._smtp_port = settings.SMTP_PORT
+        self._smtp_use_tls = settings.SMTP_USE_TLS
+        self._smtp_username = settings.SMTP_USERNAME
+        self._smtp_password = settings.SMTP_PASSWORD
+        self._pool_size = settings.SMTP_POOL_SIZE
+        self._from_header = f"{settings.EMAIL_FROM_NAME} <{settings.EMAIL_FROM}>"
+    
+    def _build_message(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None
+    ) -> Message:
+        """Build a MIME message: HTML only, or multipart with a plain text version"""
+        if text_content:
+            msg = MIMEMultipart('alternative')
+            msg.attach(MIMEText(text_content, 'plain'))
+            msg.attach(MIMEText(html_content, 'html'))
+        else:
+            # Single part: no multipart wrapper for HTML-only emails. The templates
+            # are French, so go straight to utf-8 instead of trying us-ascii first
+            msg = MIMEText(html_content, 'html', 'utf-8')
+        
+        msg['Subject'] = subject
+        msg['From'] = self._from_header
+        msg['To'] = to_email
+        return msg
+    
+    def _connect(self) -> smtplib.SMTP:
+        """Open an authenticated SMTP connection"""
+        server = smtplib.SMTP(self._smtp_host, self._smtp_port)
+        try:
+            if self._smtp_use_tls:
+                server.starttls()
             
-            <div class="appointment-details">
-                <h3>Détails du rendez-vous :</h3>
-                <p><strong>Service :</strong> {{ service }}</p>
-                <p><strong>Date :</strong> {{ appointment_date }}</p>
-                <p><strong>Heure :</strong> {{ appointment_time }}</p>
-                <p><strong>Prix :</strong> {{ price }} XAF</p>
-                {% if notes %}
-                <p><strong>Notes :</strong> {{ notes }}</p>
-                {% endif %}
-            </div>
+            if self._smtp_username and self._smtp_password:
+                server.login(self._smtp_username, self._smtp_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    @staticmethod
+    def _close_quietly(server: smtplib.SMTP):
+        """Close a connection, ignoring errors"""
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    
+    def _acquire(self) -> smtplib.SMTP:
+        """Take a live idle connection from the pool, or open a new one"""
+        while True:
+            with self._smtp_lock:
+                if not self._smtp_idle:
+                    break
+                server, last_used = self._smtp_idle.pop()
             
-            <p>Nous avons hâte de vous rencontrer !</p>
-        </div>
-        <div class="footer">
-            <p>© 2024 DATAIKÔS. Tous droits réservés.</p>
-            <p>Email : contact@dataikos.com | Tél : +237 6XX XX XX XX</p>
-        </div>
-    </div>
-</body>
-</html>
-            """
-        }
+            if time.monotonic() - last_used <= SMTP_IDLE_TIMEOUT:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self._close_quietly(server)
         
-        for filename, content in templates.items():
-            template_path = self.templates_dir / filename
-            if not template_path.exists():
-                template_path.write_text(content, encoding='utf-8')
+        return self._connect()
+    
+    def _release(self, server: smtplib.SMTP):
+        """Return a healthy connection to the pool, closing it if the pool is full"""
+        with self._smtp_lock:
+            if len(self._smtp_idle) < self._pool_size:
+                self._smtp_idle.append((server, time.monotonic()))
+                return
+        self._close_quietly(server)
+    
+    def _send_message(self, server: smtplib.SMTP, msg: Message) -> smtplib.SMTP:
+        """Deliver msg, retrying once on a fresh connection if the server hung up"""
+        # A completed send_message already ends the SMTP transaction: no RSET needed
+        try:
+            server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._close_quietly(server)
+            server = self._connect()
+            server.send_message(msg)
+        return server
+    
+    def close(self):
+        """Close every pooled SMTP connection"""
+        with self._smtp_lock:
+            idle, self._smtp_idle = self._smtp_idle, []
+        for server, _ in idle:
+            self._close_quietly(server)
     
     def send_email(
         self,
@@ -139,42 +214,141 @@ class EmailService:
         text_content: Optional[str] = None
     ) -> bool:
         """Send email using SMTP"""
-        if not settings.EMAIL_ENABLED:
+        if not self._enabled:
             logger.warning("Email service is disabled")
             return True  # Return True for testing
         
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = f"{settings.EMAIL_FROM_NAME} <{settings.EMAIL_FROM}>"
-            msg['To'] = to_email
-            
-            # Attach both HTML and plain text versions
-            if text_content:
-                part1 = MIMEText(text_content, 'plain')
-                msg.attach(part1)
+            msg = self._build_message(to_email, subject, html_content, text_content)
             
-            part2 = MIMEText(html_content, 'html')
-            msg.attach(part2)
+            server = self._acquire()
+            try:
+                server = self._send_message(server, msg)
+            except Exception:
+                # Don't reuse a connection in an unknown state
+                self._close_quietly(server)
+                raise
+            self._release(server)
             
-            # Connect to SMTP server
-            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-                if settings.SMTP_USE_TLS:
-                    server.starttls()
-                
-                if settings.SMTP_USERNAME and settings.SMTP_PASSWORD:
-                    server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
-                
-                server.send_message(msg)
-            
-            logger.info(f"Email sent to {to_email}: {subject}")
+            logger.info("Email sent to %s: %s", to_email, subject)
             return True
             
         except Exception as e:
-            logger.error(f"Failed to send email to {to_email}: {e}")
+            logger.error("Failed to send email to %s: %s", to_email, e)
             return False
     
+    def send_batch(self, emails: List[Dict[str, Any]]) -> List[bool]:
+        """Send several emails over one pooled SMTP connection"""
+        if not self._enabled:
+            logger.warning("Email service is disabled")
+            return [True] * len(emails)  # Return True for testing
+        
+        results = [False] * len(emails)
+        try:
+            server = self._acquire()
+            try:
+                for i, email in enumerate(emails):
+                    try:
+                        server = self._send_message(server, self._build_message(**email))
+                        results[i] = True
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # Bad address: skip it, keep the connection
+                        logger.error("Failed to send email to %s: %s", email['to_email'], e)
+                        server.rset()
+            except Exception:
+                self._close_quietly(server)
+                raise
+            self._release(server)
+        except Exception as e:
+            logger.error("Batch email sending failed: %s", e)
+        
+        logger.info("Batch sent: %s/%s emails", sum(results), len(emails))
+        return results
+    
+    async def send_email_async(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None
+    ) -> bool:
+        """send_email run in a worker thread, for use from async code"""
+        return await asyncio.to_thread(
+            self.send_email, to_email, subject, html_content, text_content
+        )
+    
+    async def send_batch_async(self, emails: List[Dict[str, Any]]) -> List[bool]:
+        """send_batch run in a worker thread, for use from async code"""
+        return await asyncio.to_thread(self.send_batch, emails)
+    
+    def enqueue(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: Optional[str] = None
+    ) -> bool:
+        """Queue an email for the background sender; returns False if the queue is full"""
+        try:
+            self._queue.put_nowait({
+                "to_email": to_email,
+                "subject": subject,
+                "html_content": html_content,
+                "text_content": text_content
+            })
+            return True
+        except asyncio.QueueFull:
+            logger.error("Email queue full, dropping email to %s: %s", to_email, subject)
+            return False
+    
+    async def _worker(self):
+        """Send queued emails one after another"""
+        while True:
+            email = await self._queue.get()
+            try:
+                await self.send_email_async(**email)
+            finally:
+                self._queue.task_done()
+    
+    async def run_worker(self):
+        """Drain the email queue with one sender per pooled SMTP connection until cancelled"""
+        logger.info("Starting %s email workers", self._pool_size)
+        await asyncio.gather(*(self._worker() for _ in range(self._pool_size)))
+    
+    async def drain(self, timeout: float):
+        """Wait up to timeout seconds for queued emails to be sent"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s queued emails not sent at shutdown", self._queue.qsize())
+    
+    def render_appointment_confirmation(
+        self,
+        to_email: str,
+        client_name: str,
+        appointment_date: str,
+        appointment_time: str,
+        service: str,
+        price: float,
+        notes: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Render the appointment confirmation as send_email keyword arguments"""
+        html_content = _render(
+            self._confirmation_tpl,
+            client_name=client_name,
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+            service=service,
+            price=price,
+            notes=notes
+        )
+        
+        return {
+            "to_email": to_email,
+            "subject": self.CONFIRMATION_SUBJECT.format(service),
+            "html_content": html_content
+        }
+    
     def send_appointment_confirmation(
         self,
         to_email: str,
@@ -186,9 +360,8 @@ class EmailService:
         notes: Optional[str] = None
     ) -> bool:
         """Send appointment confirmation email"""
-        template = self.jinja_env.get_template("appointment_confirmation.html")
-        
-        html_content = template.render(
+        email = self.render_appointment_confirmation(
+            to_email=to_email,
             client_name=client_name,
             appointment_date=appointment_date,
             appointment_time=appointment_time,
@@ -197,9 +370,34 @@ class EmailService:
             notes=notes
         )
         
-        subject = f"Confirmation de rendez-vous - {service}"
+        return self.send_email(**email)
+    
+    def render_appointment_reminder(
+        self,
+        to_email: str,
+        client_name: str,
+        appointment_date: str,
+        appointment_time: str,
+        service: str,
+        price: float,
+        notes: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Render the appointment reminder as send_email keyword arguments"""
+        html_content = _render(
+            self._reminder_tpl,
+            client_name=client_name,
+            appointment_date=appointment_date,
+            appointment_time=appointment_time,
+            service=service,
+            price=price,
+            notes=notes
+        )
         
-        return self.send_email(to_email, subject, html_content)
+        return {
+            "to_email": to_email,
+            "subject": self.REMINDER_SUBJECT.format(service),
+            "html_content": html_content
+        }
     
     def send_appointment_reminder(
         self,
@@ -212,9 +410,8 @@ class EmailService:
         notes: Optional[str] = None
     ) -> bool:
         """Send appointment reminder email"""
-        template = self.jinja_env.get_template("appointment_reminder.html")
-        
-        html_content = template.render(
+        email = self.render_appointment_reminder(
+            to_email=to_email,
             client_name=client_name,
             appointment_date=appointment_date,
             appointment_time=appointment_time,
@@ -223,9 +420,11 @@ class EmailService:
             notes=notes
         )
         
-        subject = f"Rappel de rendez-vous - {service}"
-        
-        return self.send_email(to_email, subject, html_content)
+        return self.send_email(**email)
+    
+    async def send_appointment_reminder_async(self, **kwargs: Any) -> bool:
+        """Async variant of send_appointment_reminder"""
+        return await self.send_email_async(**self.render_appointment_reminder(**kwargs))
 
 # Create global instance
-email_service = EmailService()
\ No newline at end of file
+email_service = EmailService()
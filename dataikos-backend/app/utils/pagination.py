@@ -0,0 +1,44 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, Query, status
+
+from app.utils.responses import ORJSONResponse
+
+# Keyset position of a row in created_at DESC, id DESC order
+Cursor = Tuple[str, str]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past row"""
+    raw = orjson.dumps([row["created_at"], str(row["id"])])
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def cursor_param(
+    cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page")
+) -> Optional[Cursor]:
+    """Dependency decoding the cursor query parameter"""
+    if cursor is None:
+        return None
+    try:
+        created_at, row_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+        # Re-serialized from parsed values: the pair is interpolated into a PostgREST filter
+        moment = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        return moment.isoformat(), str(uuid.UUID(row_id))
+    except (binascii.Error, orjson.JSONDecodeError, AttributeError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def paged_response(rows: List[Dict[str, Any]], limit: int) -> ORJSONResponse:
+    """JSON list response carrying the next page's cursor when the page is full"""
+    headers = {}
+    if rows and len(rows) >= limit and "created_at" in rows[-1] and "id" in rows[-1]:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1])
+    return ORJSONResponse(rows, headers=headers)
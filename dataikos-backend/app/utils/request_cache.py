@@ -0,0 +1,46 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Hashable, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Rows memoized for the lifetime of one HTTP request; None outside a request.
+# asyncio.to_thread copies the context, so worker threads share the same dict.
+_request_cache: ContextVar[Optional[Dict[Hashable, Any]]] = ContextVar("req_cache", default=None)
+
+
+def cache_get(key: Hashable) -> Any:
+    """Value memoized earlier in the current request, or None"""
+    cache = _request_cache.get()
+    return None if cache is None else cache.get(key)
+
+
+def cache_set(key: Hashable, value: Any) -> None:
+    """Memoize value until the end of the current request (no-op outside one)"""
+    cache = _request_cache.get()
+    if cache is not None:
+        cache[key] = value
+
+
+def cache_pop(key: Hashable) -> None:
+    """Forget a memoized value after a write"""
+    cache = _request_cache.get()
+    if cache is not None:
+        cache.pop(key, None)
+
+
+class RequestCacheMiddleware:
+    """Give every HTTP request a fresh, empty memoization dict"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_cache.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_cache.reset(token)
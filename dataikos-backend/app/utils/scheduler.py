@@ -1,8 +1,8 @@
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-import pytz
+from typing import List, Dict, Any, Optional, Set
+from zoneinfo import ZoneInfo
 
 from app.utils.supabase_client import db_manager
 from app.utils.email_service import email_service
@@ -10,101 +10,182 @@ from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Max reminders sent over one SMTP connection
+REMINDER_BATCH_SIZE = 20
+
+# Shortest pause between two reminder checks, in seconds
+MIN_CHECK_DELAY = 30
+
+# Reminder window around the appointment, in seconds before it starts
+REMINDER_WINDOW_MIN = 23 * 3600
+REMINDER_WINDOW_MAX = 25 * 3600
+REMINDER_LEAD = 24 * 3600
+
+
+class ReminderQueue:
+    """Queue of reminder emails drained in batches by a background worker"""
+    
+    def __init__(self, batch_size: int = REMINDER_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        # Queued or sent but not yet flagged reminder_sent: re-checks must not queue them again
+        self._in_flight: Set[str] = set()
+    
+    async def put(self, appointment_id: str, reminder: Dict[str, Any]) -> bool:
+        """Queue a reminder (send_appointment_reminder keyword arguments), once per appointment"""
+        if appointment_id in self._in_flight:
+            return False
+        self._in_flight.add(appointment_id)
+        await self._queue.put({"appointment_id": appointment_id, "reminder": reminder})
+        return True
+    
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """Wait for one item, then take whatever else is already queued"""
+        batch = [await self._queue.get()]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+    
+    async def _send_batch(self, batch: List[Dict[str, Any]], sent: Set[str]):
+        """Send a batch over one SMTP connection and flag the delivered ones, recording mailed ids in sent"""
+        rendered = []
+        for item in batch:
+            try:
+                rendered.append((item, email_service.render_appointment_reminder(**item["reminder"])))
+            except Exception as e:
+                # One bad payload must not hold back the rest of the batch
+                logger.error("Failed to render reminder for appointment %s: %s", item['appointment_id'], e)
+                self._in_flight.discard(item["appointment_id"])
+        if not rendered:
+            return
+        
+        results = await email_service.send_batch_async([email for _, email in rendered])
+        
+        sent_ids = [item["appointment_id"] for (item, _), ok in zip(rendered, results) if ok]
+        sent.update(sent_ids)
+        if sent_ids:
+            if await db_manager.mark_reminders_sent(sent_ids) >= len(sent_ids):
+                self._in_flight.difference_update(sent_ids)
+            else:
+                # Already mailed: stay in flight rather than be re-sent by the next check
+                logger.error("Reminders sent but not flagged for appointments %s", sent_ids)
+        
+        for (item, _), ok in zip(rendered, results):
+            if not ok:
+                logger.warning("Failed to send reminder for appointment %s", item['appointment_id'])
+                # Not mailed: a later check may queue it again
+                self._in_flight.discard(item["appointment_id"])
+    
+    async def _worker(self):
+        """Send batches one after another over a pooled SMTP connection"""
+        while True:
+            batch = await self._next_batch()
+            sent: Set[str] = set()
+            try:
+                await self._send_batch(batch, sent)
+            except Exception as e:
+                logger.error("Reminder batch error: %s", e)
+                # Release everything not confirmed mailed so a later check can queue it again
+                self._in_flight.difference_update(
+                    item["appointment_id"] for item in batch if item["appointment_id"] not in sent
+                )
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def run(self):
+        """Drain the queue with one worker per pooled SMTP connection until cancelled"""
+        logger.info("Starting %s reminder workers", settings.SMTP_POOL_SIZE)
+        await asyncio.gather(*(self._worker() for _ in range(settings.SMTP_POOL_SIZE)))
+
+
 class AppointmentScheduler:
     """Scheduler for appointment reminders"""
     
     def __init__(self):
         self.is_running = False
-        self.timezone = pytz.timezone('Africa/Douala')  # Cameroon timezone
+        self.timezone = ZoneInfo('Africa/Douala')  # Cameroon timezone
     
     async def check_reminders(self):
         """Check and send reminders for appointments in 24 hours"""
         try:
-            # Calculate target time (24 hours from now)
             now = datetime.now(self.timezone)
-            target_time = now + timedelta(hours=settings.APPOINTMENT_REMINDER_HOURS)
-            
-            # Format dates for query
-            target_date = target_time.date()
-            target_hour = target_time.hour
-            
-            logger.info(f"Checking reminders for {target_date} around {target_hour}:00")
+            now_ts = now.timestamp()
+            window_start = now + timedelta(seconds=REMINDER_WINDOW_MIN)
+            window_end = now + timedelta(seconds=REMINDER_WINDOW_MAX)
             
-            # Get appointments for the target date
-            # Note: This requires implementing a method in db_manager
-            # We'll get all appointments and filter locally for now
+            logger.info("Checking reminders between %s and %s", window_start, window_end)
             
-            appointments = await self._get_upcoming_appointments()
+            # Supabase narrows to the window's dates; only those rows are parsed here
+            appointments = await db_manager.get_appointments_between(
+                window_start.date(),
+                window_end.date()
+            )
             
+            due = []
             for appointment in appointments:
-                if not appointment.get('reminder_sent', False):
-                    # Check if appointment is ~24 hours away
-                    appointment_time = self._parse_appointment_time(appointment)
-                    if appointment_time:
-                        time_diff = appointment_time - now
-                        
-                        # If appointment is between 23 and 25 hours from now
-                        if timedelta(hours=23) < time_diff < timedelta(hours=25):
-                            await self._send_reminder(appointment)
-            
-            logger.info(f"Reminder check completed at {now}")
+                appointment_time = self._parse_appointment_time(appointment)
+                if appointment_time and (
+                    REMINDER_WINDOW_MIN < appointment_time.timestamp() - now_ts < REMINDER_WINDOW_MAX
+                ):
+                    due.append(appointment)
             
-        except Exception as e:
-            logger.error(f"Error in reminder check: {e}")
-    
-    async def _get_upcoming_appointments(self) -> List[Dict[str, Any]]:
-        """Get upcoming appointments that need reminders"""
-        try:
-            # Get appointments from the next 2 days
-            # This is a simplified version - in production, use a proper query
-            
-            # First get all appointments with their time slots
-            appointments = []
+            # Queue all due reminders at once; the workers send them concurrently
+            await asyncio.gather(
+                *(self._send_reminder(appointment) for appointment in due),
+                return_exceptions=True
+            )
             
-            # Query logic will depend on your database structure
-            # For now, return empty list
-            return appointments
+            logger.info("Reminder check completed at %s: %s due", now, len(due))
             
         except Exception as e:
-            logger.error(f"Error getting upcoming appointments: {e}")
-            return []
+            logger.error("Error in reminder check: %s", e)
     
     def _parse_appointment_time(self, appointment: Dict[str, Any]) -> Optional[datetime]:
-        """Parse appointment date and time to datetime object"""
+        """Combine the embedded time slot date and start time into a local datetime"""
         try:
-            # This depends on how you store appointment times
-            # Adjust based on your data structure
-            return None
+            slot = appointment.get('time_slot') or {}
+            return datetime.fromisoformat(
+                f"{slot['date']}T{slot['start_time']}"
+            ).replace(tzinfo=self.timezone)
         except Exception as e:
-            logger.error(f"Error parsing appointment time: {e}")
+            logger.error("Error parsing appointment time: %s", e)
             return None
     
+    async def _seconds_until_next_check(self) -> float:
+        """Sleep until the next pending appointment is 24h away, within [MIN_CHECK_DELAY, interval]"""
+        max_delay = settings.SCHEDULER_CHECK_INTERVAL * 60
+        now = datetime.now(self.timezone)
+        now_ts = now.timestamp()
+        threshold = now + timedelta(seconds=REMINDER_WINDOW_MIN)
+        
+        slots = await db_manager.get_upcoming_reminder_slots(threshold.date())
+        for slot in slots:
+            slot_time = self._parse_appointment_time({'time_slot': slot})
+            if slot_time and slot_time.timestamp() - now_ts > REMINDER_WINDOW_MIN:
+                delay = slot_time.timestamp() - REMINDER_LEAD - now_ts
+                return min(max(delay, MIN_CHECK_DELAY), max_delay)
+        
+        return max_delay
+    
     async def _send_reminder(self, appointment: Dict[str, Any]):
-        """Send reminder email and update appointment"""
+        """Queue reminder email; the worker sends it and updates the appointment"""
         try:
-            # Send email
-            success = email_service.send_appointment_reminder(
-                to_email=appointment['client_email'],
-                client_name=appointment['client_name'],
-                appointment_date=appointment.get('appointment_date', 'N/A'),
-                appointment_time=appointment.get('appointment_time', 'N/A'),
-                service=appointment.get('service', 'Service'),
-                price=appointment.get('price', 0),
-                notes=appointment.get('notes')
-            )
-            
-            if success:
-                # Mark reminder as sent
-                await db_manager.update_appointment(
-                    appointment['id'],
-                    {'reminder_sent': True}
-                )
-                logger.info(f"Reminder sent for appointment {appointment['id']}")
-            else:
-                logger.warning(f"Failed to send reminder for appointment {appointment['id']}")
+            slot = appointment.get('time_slot') or {}
+            queued = await reminder_queue.put(appointment['id'], {
+                'to_email': appointment['client_email'],
+                'client_name': appointment['client_name'],
+                'appointment_date': slot.get('date', 'N/A'),
+                'appointment_time': slot.get('start_time', 'N/A'),
+                'service': appointment.get('service', 'Service'),
+                'price': appointment.get('price', 0),
+                'notes': appointment.get('notes')
+            })
+            if queued:
+                logger.info("Reminder queued for appointment %s", appointment['id'])
                 
         except Exception as e:
-            logger.error(f"Error sending reminder: {e}")
+            logger.error("Error queueing reminder: %s", e)
     
     async def start(self):
         """Start the scheduler"""
@@ -119,15 +200,21 @@ class AppointmentScheduler:
             try:
                 await self.check_reminders()
             except Exception as e:
-                logger.error(f"Scheduler error: {e}")
+                logger.error("Scheduler error: %s", e)
             
-            # Wait for the next check interval
-            await asyncio.sleep(settings.SCHEDULER_CHECK_INTERVAL * 60)
+            # Wake up when the next reminder is due, at most one interval later
+            try:
+                delay = await self._seconds_until_next_check()
+            except Exception as e:
+                logger.error("Scheduler error: %s", e)
+                delay = settings.SCHEDULER_CHECK_INTERVAL * 60
+            await asyncio.sleep(delay)
     
     def stop(self):
         """Stop the scheduler"""
         self.is_running = False
         logger.info("Stopping appointment scheduler")
 
-# Global scheduler instance
+# Global instances
+reminder_queue = ReminderQueue()
 scheduler = AppointmentScheduler()
\ No newline at end of file
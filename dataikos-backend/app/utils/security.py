@@ -1,19 +1,75 @@
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache, partial
+from typing import Optional, Dict, Any, Callable, Tuple
+from jose import JWTError, jwk, jwt
 from app.config import settings
+from app.utils.cache import TTLCache
+import base64
+import bcrypt
+import hashlib
+import hmac
 import secrets
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Decoded claims of recently verified tokens, keyed by a BLAKE2b-128 digest
+_verified_claims_cache = TTLCache(maxsize=4096, ttl=5)
+
+# HMAC key built once instead of on every jwt.encode call
+_SIGNING_KEY = jwk.construct(settings.SECRET_KEY, settings.ALGORITHM)
+
+# bcrypt only looks at the first 72 bytes of its input
+_BCRYPT_MAX_BYTES = 72
+
+def _prehash(password: str) -> bytes:
+    """Peppered SHA-256 prehash so bcrypt always receives a fixed 44-byte input"""
+    digest = hashlib.sha256((settings.PASSWORD_PEPPER + password).encode()).digest()
+    return base64.b64encode(digest)
+
+def _checkpw(candidate: bytes, hashed: bytes) -> bool:
+    """Constant-time comparison of a bcrypt candidate against a stored hash"""
+    return hmac.compare_digest(bcrypt.hashpw(candidate, hashed), hashed)
+
+# Marks hashes of the peppered prehash, checked with a single bcrypt round.
+# Unmarked hashes (raw password, or prehash stored before the marker existed)
+# are tried both ways and upgraded on the next successful login. Remove the
+# unmarked branch once this returns 0:
+#   SELECT count(*) FROM users WHERE password_hash NOT LIKE '$sha256$%';
+_PREHASH_MARKER = "$sha256$"
+
+def check_password(plain_password: str, hashed_password: str) -> Tuple[bool, bool]:
+    """Verify a password against its hash; returns (valid, needs_rehash)"""
+    try:
+        if hashed_password.startswith(_PREHASH_MARKER):
+            hashed = hashed_password[len(_PREHASH_MARKER):].encode()
+            return _checkpw(_prehash(plain_password), hashed), False
+
+        hashed = hashed_password.encode()
+        valid = (
+            _checkpw(_prehash(plain_password), hashed)
+            or _checkpw(plain_password.encode()[:_BCRYPT_MAX_BYTES], hashed)
+        )
+        return valid, valid
+    except ValueError:
+        # Malformed or empty stored hash
+        return False, False
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return check_password(plain_password, hashed_password)[0]
 
 def get_password_hash(password: str) -> str:
     """Generate password hash"""
-    return pwd_context.hash(password)
+    return _PREHASH_MARKER + bcrypt.hashpw(_prehash(password), bcrypt.gensalt()).decode()
+
+@lru_cache(maxsize=1)
+def _dummy_password_hash() -> str:
+    """Hash of a random secret, computed once"""
+    return get_password_hash(secrets.token_urlsafe(16))
+
+def verify_dummy_password(password: str) -> bool:
+    """Spend the same bcrypt work as a real check, always failing"""
+    verify_password(password, _dummy_password_hash())
+    return False
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
@@ -25,7 +81,7 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SIGNING_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: Dict[str, Any]) -> str:
@@ -33,17 +89,48 @@ def create_refresh_token(data: Dict[str, Any]) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _SIGNING_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+@lru_cache(maxsize=8)
+def _get_verifier(algorithm: str, key: str) -> Callable[[str], Dict[str, Any]]:
+    """Build a JWT decoder bound to a pre-constructed key for (algorithm, key)"""
+    return partial(
+        jwt.decode,
+        key=jwk.construct(key, algorithm),
+        algorithms=[algorithm],
+        options={"require_exp": True, "require_sub": True},
+    )
+
 def verify_token(token: str) -> Optional[Dict[str, Any]]:
     """Verify and decode JWT token"""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
+        payload = _get_verifier(settings.ALGORITHM, settings.SECRET_KEY)(token)
     except JWTError:
         return None
 
+    if "type" not in payload:
+        return None
+    return payload
+
+def verify_token_cached(token: str) -> Optional[Dict[str, Any]]:
+    """Verify token, reusing the claims of a recent successful verification"""
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    payload = _verified_claims_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = verify_token(token)
+    if payload is None:
+        return None
+
+    # Never keep claims past the token's own expiry
+    remaining = payload["exp"] - time.time()
+    if remaining > 0:
+        _verified_claims_cache.set(key, payload, ttl=min(_verified_claims_cache.ttl, remaining))
+
+    return payload
+
 def generate_api_key() -> str:
     """Generate random API key"""
     return secrets.token_urlsafe(32)
@@ -1,13 +1,114 @@
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import sys
+import threading
+from collections import Counter
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 from datetime import date, time, datetime, timedelta
 
-from supabase import create_client, Client
+import httpx
+import orjson
+from postgrest.exceptions import APIError
+from postgrest.types import CountMethod, ReturnMethod
+from postgrest.utils import AsyncClient as AsyncPostgrestSession, SyncClient as PostgrestSession
+from supabase import acreate_client, create_client, AsyncClient, Client
 from app.config import settings
 from app.utils.security import get_password_hash
+from app.utils.cache import TTLCache
+from app.utils import request_cache
 
 logger = logging.getLogger(__name__)
 
+# Keep-alive pool used by every PostgREST call of a client, sized for the
+# asyncio.to_thread workers (up to 32) plus Starlette's threadpool for def routes
+_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=30)
+_HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+# Connection attempts retried once before a call fails (e.g. after a network blip)
+_HTTP_CONNECT_RETRIES = 1
+# Statuses counted one by one when the per-status stats RPCs are missing
+ORDER_STATUSES = ("pending", "completed", "cancelled")
+MESSAGE_STATUSES = ("unread", "read")
+
+# Rows per bulk INSERT: around 1000 rows per statement is where Postgres stops
+# gaining from larger batches, and the JSON body stays a few hundred KB
+BULK_INSERT_CHUNK_SIZE = 1000
+
+
+class _ORJSONHTTPResponse(httpx.Response):
+    """httpx response whose json() (called by postgrest on every reply) uses orjson"""
+
+    def json(self, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().json(**kwargs)
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError, which postgrest catches
+        return orjson.loads(self.content)
+
+
+class _ORJSONTransport(httpx.HTTPTransport):
+    """Keep-alive transport handing back _ORJSONHTTPResponse objects"""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = super().handle_request(request)
+        response.__class__ = _ORJSONHTTPResponse
+        return response
+
+
+class _AsyncORJSONTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of _ORJSONTransport"""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await super().handle_async_request(request)
+        response.__class__ = _ORJSONHTTPResponse
+        return response
+
+
+# fromisoformat only accepts a trailing 'Z' since Python 3.11
+if sys.version_info >= (3, 11):
+    _parse_timestamp = datetime.fromisoformat
+else:
+    def _parse_timestamp(value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _is_missing_function(error: Exception) -> bool:
+    """True when an RPC failed because its SQL function is not deployed"""
+    # PGRST202: not in PostgREST's schema cache; 42883: undefined_function
+    return isinstance(error, APIError) and error.code in ("PGRST202", "42883")
+
+
+def _non_null(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Equality filters without the unset (None) ones, ready for query.match()"""
+    return {k: v for k, v in (filters or {}).items() if v is not None}
+
+
+def _keyset_page(query, limit: int, offset: int, after: Optional[Tuple[str, str]]):
+    """Newest-first page: rows past the (created_at, id) cursor, or offset when none"""
+    query = query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+    if after is None:
+        return query.offset(offset)
+    created_at, row_id = after
+    # Quoted: timestamps carry ':' and '+', which PostgREST reserves in or=()
+    return query.or_(
+        f'created_at.lt."{created_at}",'
+        f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+    )
+
+
+def _truncate(moment: datetime, bucket: str) -> datetime:
+    """Python equivalent of date_trunc('day' | 'week' | 'month', moment)"""
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+# Working day and slot capacity, parsed once (settings do not change at runtime)
+_WORKING_START = time.fromisoformat(settings.WORKING_HOURS_START)
+_WORKING_END = time.fromisoformat(settings.WORKING_HOURS_END)
+_MAX_CAPACITY = settings.MAX_APPOINTMENTS_PER_SLOT
+
 
 # =========================
 # Supabase Client Singleton
@@ -15,39 +116,122 @@ logger = logging.getLogger(__name__)
 
 class SupabaseClient:
     """Singleton for Supabase client instances"""
+    __slots__ = ()
+
     _instance: Optional[Client] = None
     _service_instance: Optional[Client] = None
+    # Serializes first creation so concurrent callers never build two clients
+    _lock = threading.Lock()
+    # Async client for code running on the event loop (the reminder scheduler)
+    _async_instance: Optional[AsyncClient] = None
+    _async_lock = asyncio.Lock()
+
+    @staticmethod
+    def _create(url: str, key: str) -> Client:
+        """Create a client whose PostgREST session uses a bounded keep-alive pool"""
+        client = create_client(url, key)
+
+        postgrest = client.postgrest
+        default_session = postgrest.session
+        postgrest.session = PostgrestSession(
+            base_url=default_session.base_url,
+            headers=default_session.headers,
+            timeout=_HTTP_TIMEOUT,
+            follow_redirects=True,
+            transport=_ORJSONTransport(
+                http2=True,
+                limits=_HTTP_LIMITS,
+                retries=_HTTP_CONNECT_RETRIES,
+            ),
+        )
+        default_session.close()
+
+        return client
 
     @classmethod
     def get_client(cls) -> Client:
         """Get regular Supabase client"""
         if cls._instance is None:
-            try:
-                cls._instance = create_client(
-                    settings.SUPABASE_URL,
-                    settings.SUPABASE_KEY
-                )
-                logger.info("Supabase client initialized")
-            except Exception as e:
-                logger.error("Supabase init failed", exc_info=True)
-                raise
+            with cls._lock:
+                if cls._instance is None:
+                    try:
+                        cls._instance = cls._create(
+                            settings.SUPABASE_URL,
+                            settings.SUPABASE_KEY
+                        )
+                        logger.info("Supabase client initialized")
+                    except Exception as e:
+                        logger.exception("Supabase init failed")
+                        raise
         return cls._instance
 
     @classmethod
     def get_service_client(cls) -> Client:
         """Get service role Supabase client"""
         if cls._service_instance is None:
-            try:
-                cls._service_instance = create_client(
-                    settings.SUPABASE_URL,
-                    settings.SUPABASE_SERVICE_ROLE_KEY
-                )
-                logger.info("Supabase service client initialized")
-            except Exception as e:
-                logger.error("Supabase service init failed", exc_info=True)
-                raise
+            with cls._lock:
+                if cls._service_instance is None:
+                    try:
+                        cls._service_instance = cls._create(
+                            settings.SUPABASE_URL,
+                            settings.SUPABASE_SERVICE_ROLE_KEY
+                        )
+                        logger.info("Supabase service client initialized")
+                    except Exception as e:
+                        logger.exception("Supabase service init failed")
+                        raise
         return cls._service_instance
 
+    @classmethod
+    async def get_async_client(cls) -> AsyncClient:
+        """Get the async Supabase client, awaited without a worker thread"""
+        if cls._async_instance is None:
+            async with cls._async_lock:
+                if cls._async_instance is None:
+                    try:
+                        client = await acreate_client(
+                            settings.SUPABASE_URL,
+                            settings.SUPABASE_KEY
+                        )
+                        postgrest = client.postgrest
+                        default_session = postgrest.session
+                        postgrest.session = AsyncPostgrestSession(
+                            base_url=default_session.base_url,
+                            headers=default_session.headers,
+                            timeout=_HTTP_TIMEOUT,
+                            follow_redirects=True,
+                            transport=_AsyncORJSONTransport(
+                                http2=True,
+                                limits=_HTTP_LIMITS,
+                                retries=_HTTP_CONNECT_RETRIES,
+                            ),
+                        )
+                        await default_session.aclose()
+                        cls._async_instance = client
+                        logger.info("Supabase async client initialized")
+                    except Exception:
+                        logger.exception("Supabase async init failed")
+                        raise
+        return cls._async_instance
+
+    @classmethod
+    async def close_async(cls):
+        """Close pooled HTTP connections of the async client"""
+        async with cls._async_lock:
+            if cls._async_instance is not None:
+                await cls._async_instance.postgrest.aclose()
+            cls._async_instance = None
+
+    @classmethod
+    def close(cls):
+        """Close pooled HTTP connections of both clients"""
+        with cls._lock:
+            for client in (cls._instance, cls._service_instance):
+                if client is not None:
+                    client.postgrest.aclose()
+            cls._instance = None
+            cls._service_instance = None
+
 
 # =================
 # Database Manager
@@ -59,81 +243,187 @@ class DatabaseManager:
     def __init__(self):
         self.client = SupabaseClient.get_client()
         self.service_client = SupabaseClient.get_service_client()
+        # Rows read by username on every authenticated request
+        self._user_cache = TTLCache(maxsize=2048, ttl=30)
+        # Usernames recently looked up and not found
+        self._missing_users = TTLCache(maxsize=8192, ttl=60)
+        # Rows read by email, cleared on any user write
+        self._email_cache = TTLCache(maxsize=1024, ttl=30)
+        # Admin dashboard payloads, evicted by the writes that change them
+        self.dashboard_cache = TTLCache(maxsize=256, ttl=30)
+        # Public gallery listings and categories, cleared on gallery writes
+        self.gallery_cache = TTLCache(maxsize=32, ttl=60)
+        # Slot listings per ISO date (raw and with availability), evicted by the writes that change them
+        self.slot_cache = TTLCache(maxsize=192, ttl=30)
+        # initialize_database runs at most once per process
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def close(self):
+        """Release pooled connections (called on application shutdown)"""
+        SupabaseClient.close()
+
+    async def aclose(self):
+        """Release the async client's pooled connections (called on application shutdown)"""
+        await SupabaseClient.close_async()
 
     # ==================
     # INITIALIZATION
     # ==================
 
     def initialize_database(self):
-        """Initialize database with default admin user"""
+        """Initialize database with default admin user (once per process)"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            self._initialized = True
+            self._initialize_database()
+
+    def _initialize_database(self):
+        """Create the admin user if it does not exist yet"""
         try:
             logger.info("Initializing database...")
             
             # Check if admin user exists
             if settings.ADMIN_USERNAME and settings.ADMIN_PASSWORD:
-                existing_admin = self.get_user_by_username(settings.ADMIN_USERNAME)
+                existing_admin = self.get_user_by_username(settings.ADMIN_USERNAME, cache=False)
                 
                 if not existing_admin:
                     # Create admin user
+                    now_iso = datetime.utcnow().isoformat()
                     admin_data = {
                         "username": settings.ADMIN_USERNAME,
                         "email": settings.ADMIN_EMAIL or f"{settings.ADMIN_USERNAME}@dataikos.com",
                         "password_hash": get_password_hash(settings.ADMIN_PASSWORD),
                         "is_admin": True,
                         "is_active": True,
-                        "created_at": datetime.utcnow().isoformat(),
-                        "updated_at": datetime.utcnow().isoformat()
+                        "created_at": now_iso,
+                        "updated_at": now_iso
                     }
                     
                     self.create_user(admin_data)
-                    logger.info(f"Admin user created: {settings.ADMIN_USERNAME}")
+                    logger.info("Admin user created: %s", settings.ADMIN_USERNAME)
                 else:
                     logger.info("Admin user already exists")
             
             logger.info("Database initialization complete")
             
         except Exception as e:
-            logger.error(f"Database initialization failed: {e}", exc_info=True)
+            logger.exception("Database initialization failed: %s", e)
 
     # ==================
     # USERS
     # ==================
 
-    def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
-        """Get user by username"""
+    def get_user_by_username(self, username: str, cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Get user by username (cached for a few seconds; cache=False reads the table)"""
+        if cache:
+            user = self._user_cache.get(username)
+            if user is not None or self._missing_users.get(username):
+                return user
+
         try:
             res = (
                 self.client.table("users")
                 .select("*")
                 .eq("username", username)
+                .maybe_single()
+                .execute()
+            )
+        except Exception as e:
+            logger.exception("get_user_by_username failed: %s", e)
+            return None
+
+        if res is None:
+            self._missing_users.set(username, True)
+            return None
+
+        self._user_cache.set(username, res.data)
+        return res.data
+
+    async def aget_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """get_user_by_username on the async client: cache hits never leave the event loop"""
+        user = self._user_cache.get(username)
+        if user is not None or self._missing_users.get(username):
+            return user
+
+        try:
+            client = await SupabaseClient.get_async_client()
+            res = await (
+                client.table("users")
+                .select("*")
+                .eq("username", username)
+                .maybe_single()
                 .execute()
             )
-            return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"get_user_by_username failed: {e}", exc_info=True)
+            logger.exception("aget_user_by_username failed: %s", e)
+            return None
+
+        if res is None:
+            self._missing_users.set(username, True)
             return None
 
-    def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        """Get user by email"""
+        self._user_cache.set(username, res.data)
+        return res.data
+
+    def _evict_slots(self, day: Optional[str]):
+        """Drop every cached slot listing of an ISO date"""
+        self.slot_cache.pop(day)
+        self.slot_cache.pop(("available", day, False))
+        self.slot_cache.pop(("available", day, True))
+
+    def _invalidate_dashboard(self, *keys: str):
+        """Evict cached dashboard payloads (all of them when no key is given)"""
+        if not keys:
+            self.dashboard_cache.clear()
+        for key in keys:
+            self.dashboard_cache.pop(key)
+
+    def invalidate_user(self, username: Optional[str] = None):
+        """Forget cached lookups for username, or for every user when unknown"""
+        if username is None:
+            self._user_cache.clear()
+            self._missing_users.clear()
+        else:
+            self._user_cache.pop(username)
+            self._missing_users.pop(username)
+        # Emails can change on any user write and are not keyed by username
+        self._email_cache.clear()
+
+    def get_user_by_email(self, email: str, cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Get user by email (cached for a few seconds; cache=False reads the table)"""
+        if cache:
+            user = self._email_cache.get(email)
+            if user is not None:
+                return user
+
         try:
             res = (
                 self.client.table("users")
                 .select("*")
                 .eq("email", email)
+                .maybe_single()
                 .execute()
             )
-            return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"get_user_by_email failed: {e}", exc_info=True)
+            logger.exception("get_user_by_email failed: %s", e)
+            return None
+
+        if res is None:
             return None
 
+        self._email_cache.set(email, res.data)
+        return res.data
+
     def create_user(self, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Create new user"""
         try:
             res = self.client.table("users").insert(user_data).execute()
+            self.invalidate_user(user_data.get("username"))
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"create_user failed: {e}", exc_info=True)
+            logger.exception("create_user failed: %s", e)
             return None
 
     def update_user(self, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -145,9 +435,10 @@ class DatabaseManager:
                 .eq("id", user_id)
                 .execute()
             )
+            self.invalidate_user(res.data[0].get("username") if res.data else None)
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"update_user failed: {e}", exc_info=True)
+            logger.exception("update_user failed: %s", e)
             return None
 
     # ==================
@@ -158,35 +449,101 @@ class DatabaseManager:
         """Create new order"""
         try:
             res = self.client.table("orders").insert(order_data).execute()
+            self._invalidate_dashboard()
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"create_order failed: {e}", exc_info=True)
+            logger.exception("create_order failed: %s", e)
+            return None
+
+    def create_order_with_appointment(
+        self,
+        order_data: Dict[str, Any],
+        appointment_data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Create order, book its time slot and create the appointment atomically.
+        Returns {"order", "appointment", "time_slot"}; appointment and time_slot
+        are None when the slot was already full.
+        """
+        try:
+            res = self.client.rpc(
+                "create_order_with_appointment",
+                {"p_order": order_data, "p_appointment": appointment_data}
+            ).execute()
+            self._invalidate_dashboard()
+            if res.data and res.data.get("time_slot"):
+                self._evict_slots(res.data["time_slot"].get("date"))
+            return res.data or None
+        except Exception as e:
+            if not _is_missing_function(e):
+                logger.exception("create_order_with_appointment failed: %s", e)
+                return None
+            logger.warning("create_order_with_appointment RPC missing, creating step by step: %s", e)
+
+        return self._create_order_with_appointment_steps(order_data, appointment_data)
+
+    def _create_order_with_appointment_steps(
+        self,
+        order_data: Dict[str, Any],
+        appointment_data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Same result as the RPC in separate requests (not atomic; a failed booking is rolled back)"""
+        order = self.create_order(order_data)
+        if not order:
             return None
 
+        result = {"order": order, "appointment": None, "time_slot": None}
+        slot = self.get_time_slot(appointment_data["time_slot_id"])
+        if not slot or slot.get("current_bookings", 0) >= slot.get("max_capacity", _MAX_CAPACITY):
+            return result
+
+        now_iso = datetime.utcnow().isoformat()
+        appointment = self.create_appointment({
+            **appointment_data,
+            "order_id": order["id"],
+            "status": "confirmed",
+            "created_at": now_iso,
+            "updated_at": now_iso
+        })
+        if not appointment:
+            return result
+
+        if not self.increment_time_slot_bookings(slot["id"]):
+            self.delete_appointment(appointment["id"])
+            return result
+
+        order = self.update_order(order["id"], {"appointment_id": appointment["id"]}) or order
+        return {"order": order, "appointment": appointment, "time_slot": slot}
+
     def get_orders(
         self,
         filters: Optional[Dict[str, Any]] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        since: Optional[datetime] = None,
+        columns: str = "*",
+        after: Optional[Tuple[str, str]] = None
     ) -> List[Dict[str, Any]]:
-        """Get orders with optional filters"""
+        """Get orders with optional filters, created at or after `since` if given
+
+        `after` is the (created_at, id) of the previous page's last row and
+        replaces `offset`, which Postgres has to scan and discard.
+        Index-covered filters: status (see README, Index).
+        """
+        filters = _non_null(filters)
         try:
-            query = self.client.table("orders").select("*")
+            query = self.client.table("orders").select(columns)
 
             if filters:
-                for k, v in filters.items():
-                    if v is not None:
-                        query = query.eq(k, v)
+                query = query.match(filters)
 
-            res = (
-                query.order("created_at", desc=True)
-                .limit(limit)
-                .offset(offset)
-                .execute()
-            )
+            if since is not None:
+                query = query.gte("created_at", since.isoformat())
+
+            res = _keyset_page(query, limit, offset, after).execute()
             return res.data or []
         except Exception as e:
-            logger.error(f"get_orders failed: {e}", exc_info=True)
+            logger.exception("get_orders failed: %s", e)
             return []
 
     def get_order_by_id(self, order_id: str) -> Optional[Dict[str, Any]]:
@@ -196,11 +553,13 @@ class DatabaseManager:
                 self.client.table("orders")
                 .select("*")
                 .eq("id", order_id)
+                .maybe_single()
                 .execute()
             )
-            return res.data[0] if res.data else None
+            # maybe_single() yields None rather than an empty response on a miss
+            return res.data if res else None
         except Exception as e:
-            logger.error(f"get_order_by_id failed: {e}", exc_info=True)
+            logger.exception("get_order_by_id failed: %s", e)
             return None
 
     def update_order(self, order_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -213,23 +572,75 @@ class DatabaseManager:
                 .eq("id", order_id)
                 .execute()
             )
+            self._invalidate_dashboard()
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"update_order failed: {e}", exc_info=True)
+            logger.exception("update_order failed: %s", e)
             return None
 
+    def _bulk_insert(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        """Insert rows in BULK_INSERT_CHUNK_SIZE batches and return how many were written"""
+        inserted = 0
+        for i in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+            chunk = rows[i:i + BULK_INSERT_CHUNK_SIZE]
+            try:
+                res = (
+                    self.client.table(table)
+                    .insert(
+                        chunk,
+                        count=CountMethod.exact,
+                        returning=ReturnMethod.minimal,
+                        # Keys missing from a row take the column default, not NULL
+                        default_to_null=False
+                    )
+                    .execute()
+                )
+            except Exception as e:
+                logger.exception("bulk insert into %s failed after %d rows: %s", table, inserted, e)
+                break
+            inserted += res.count or 0
+        return inserted
+
+    def bulk_create_orders(self, items: List[Dict[str, Any]]) -> int:
+        """Create many orders in chunked multi-row INSERTs (admin importer)"""
+        inserted = self._bulk_insert("orders", items)
+        self._invalidate_dashboard()
+        return inserted
+
+    def bulk_update_orders(self, order_ids: List[str], status: str) -> int:
+        """Set status on several orders in one UPDATE and return how many changed"""
+        if not order_ids:
+            return 0
+        try:
+            res = (
+                self.client.table("orders")
+                .update(
+                    {"status": status, "updated_at": datetime.utcnow().isoformat()},
+                    count=CountMethod.exact,
+                    returning=ReturnMethod.minimal
+                )
+                .in_("id", order_ids)
+                .execute()
+            )
+            self._invalidate_dashboard()
+            return res.count or 0
+        except Exception as e:
+            logger.exception("bulk_update_orders failed: %s", e)
+            return 0
+
     def delete_order(self, order_id: str) -> bool:
         """Delete order"""
         try:
             res = (
                 self.client.table("orders")
-                .delete()
+                .delete(count=CountMethod.exact, returning=ReturnMethod.minimal)
                 .eq("id", order_id)
                 .execute()
             )
-            return bool(res.data)
+            self._invalidate_dashboard()
+            return bool(res.count)
         except Exception as e:
-            logger.error(f"delete_order failed: {e}", exc_info=True)
+            logger.exception("delete_order failed: %s", e)
             return False
 
     # ==================
@@ -240,35 +651,41 @@ class DatabaseManager:
         """Create new message"""
         try:
             res = self.client.table("contact_messages").insert(message_data).execute()
+            self._invalidate_dashboard("stats", "recent-activity")
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"create_message failed: {e}", exc_info=True)
+            logger.exception("create_message failed: %s", e)
             return None
 
+    def bulk_create_messages(self, items: List[Dict[str, Any]]) -> int:
+        """Create many messages in chunked multi-row INSERTs (admin importer)"""
+        inserted = self._bulk_insert("contact_messages", items)
+        self._invalidate_dashboard("stats", "recent-activity")
+        return inserted
+
     def get_messages(
         self,
         filters: Optional[Dict[str, Any]] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        columns: str = "*",
+        after: Optional[Tuple[str, str]] = None
     ) -> List[Dict[str, Any]]:
-        """Get messages with optional filters"""
+        """Get messages with optional filters (keyset-paged past `after` when given)
+
+        Index-covered filters: status (see README, Index).
+        """
+        filters = _non_null(filters)
         try:
-            query = self.client.table("contact_messages").select("*")
+            query = self.client.table("contact_messages").select(columns)
 
             if filters:
-                for k, v in filters.items():
-                    if v is not None:
-                        query = query.eq(k, v)
+                query = query.match(filters)
 
-            res = (
-                query.order("created_at", desc=True)
-                .limit(limit)
-                .offset(offset)
-                .execute()
-            )
+            res = _keyset_page(query, limit, offset, after).execute()
             return res.data or []
         except Exception as e:
-            logger.error(f"get_messages failed: {e}", exc_info=True)
+            logger.exception("get_messages failed: %s", e)
             return []
 
     def get_message_by_id(self, message_id: str) -> Optional[Dict[str, Any]]:
@@ -278,11 +695,12 @@ class DatabaseManager:
                 self.client.table("contact_messages")
                 .select("*")
                 .eq("id", message_id)
+                .maybe_single()
                 .execute()
             )
-            return res.data[0] if res.data else None
+            return res.data if res else None
         except Exception as e:
-            logger.error(f"get_message_by_id failed: {e}", exc_info=True)
+            logger.exception("get_message_by_id failed: %s", e)
             return None
 
     def update_message(self, message_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -294,9 +712,10 @@ class DatabaseManager:
                 .eq("id", message_id)
                 .execute()
             )
+            self._invalidate_dashboard("stats", "recent-activity")
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"update_message failed: {e}", exc_info=True)
+            logger.exception("update_message failed: %s", e)
             return None
 
     def delete_message(self, message_id: str) -> bool:
@@ -304,13 +723,14 @@ class DatabaseManager:
         try:
             res = (
                 self.client.table("contact_messages")
-                .delete()
+                .delete(count=CountMethod.exact, returning=ReturnMethod.minimal)
                 .eq("id", message_id)
                 .execute()
             )
-            return bool(res.data)
+            self._invalidate_dashboard("stats", "recent-activity")
+            return bool(res.count)
         except Exception as e:
-            logger.error(f"delete_message failed: {e}", exc_info=True)
+            logger.exception("delete_message failed: %s", e)
             return False
 
     # ==================
@@ -321,49 +741,101 @@ class DatabaseManager:
         """Create new gallery item"""
         try:
             res = self.client.table("gallery").insert(item_data).execute()
+            self.gallery_cache.clear()
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"create_gallery_item failed: {e}", exc_info=True)
+            logger.exception("create_gallery_item failed: %s", e)
+            return None
+
+    def bulk_create_gallery_items(self, items: List[Dict[str, Any]]) -> int:
+        """Create many gallery items in chunked multi-row INSERTs (admin importer)"""
+        inserted = self._bulk_insert("gallery", items)
+        self.gallery_cache.clear()
+        return inserted
+
+    def get_gallery_item(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """Get gallery item by ID"""
+        try:
+            res = (
+                self.client.table("gallery")
+                .select("*")
+                .eq("id", item_id)
+                .maybe_single()
+                .execute()
+            )
+            return res.data if res else None
+        except Exception as e:
+            logger.exception("get_gallery_item failed: %s", e)
             return None
 
     def get_gallery_items(
         self,
         filters: Optional[Dict[str, Any]] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        after: Optional[Tuple[str, str]] = None
     ) -> List[Dict[str, Any]]:
-        """Get gallery items with optional filters"""
+        """Get gallery items with optional filters (cached until the next write)
+
+        Index-covered filters: category (see README, Index).
+        """
+        filters = _non_null(filters)
+        key = (tuple(sorted(filters.items())), limit, offset, after)
+        items = self.gallery_cache.get(key)
+        if items is not None:
+            return items
+
         try:
             query = self.client.table("gallery").select("*")
 
             if filters:
-                for k, v in filters.items():
-                    if v is not None:
-                        query = query.eq(k, v)
+                query = query.match(filters)
 
-            res = (
-                query.order("created_at", desc=True)
-                .limit(limit)
-                .offset(offset)
-                .execute()
-            )
-            return res.data or []
+            res = _keyset_page(query, limit, offset, after).execute()
         except Exception as e:
-            logger.error(f"get_gallery_items failed: {e}", exc_info=True)
+            logger.exception("get_gallery_items failed: %s", e)
             return []
 
+        items = res.data or []
+        self.gallery_cache.set(key, items)
+        return items
+
+    def get_gallery_categories(self) -> List[str]:
+        """Distinct gallery categories (cached until the next write)"""
+        categories = self.gallery_cache.get("categories")
+        if categories is not None:
+            return categories
+
+        try:
+            res = self.client.rpc("get_gallery_categories").execute()
+            categories = [row["category"] for row in res.data or []]
+        except Exception as e:
+            logger.warning("get_gallery_categories RPC failed, scanning locally: %s", e)
+            try:
+                rows = self._select_all(
+                    lambda: self.client.table("gallery").select("category").order("id")
+                )
+                categories = sorted({row["category"] for row in rows if row.get("category")})
+            except Exception as e:
+                logger.exception("get_gallery_categories failed: %s", e)
+                return []
+
+        self.gallery_cache.set("categories", categories)
+        return categories
+
     def delete_gallery_item(self, item_id: str) -> bool:
         """Delete gallery item"""
         try:
             res = (
                 self.client.table("gallery")
-                .delete()
+                .delete(count=CountMethod.exact, returning=ReturnMethod.minimal)
                 .eq("id", item_id)
                 .execute()
             )
-            return bool(res.data)
+            self.gallery_cache.clear()
+            return bool(res.count)
         except Exception as e:
-            logger.error(f"delete_gallery_item failed: {e}", exc_info=True)
+            logger.exception("delete_gallery_item failed: %s", e)
             return False
 
     # ==================
@@ -374,101 +846,235 @@ class DatabaseManager:
         """Create new time slot"""
         try:
             res = self.client.table("time_slots").insert(data).execute()
+            self._evict_slots(data.get("date"))
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"create_time_slot failed: {e}", exc_info=True)
+            logger.exception("create_time_slot failed: %s", e)
             return None
 
     def get_time_slot(self, slot_id: str) -> Optional[Dict[str, Any]]:
-        """Get time slot by ID"""
+        """Get time slot by ID (memoized for the rest of the current request)"""
+        key = ("time_slot", slot_id)
+        slot = request_cache.cache_get(key)
+        if slot is not None:
+            return slot
+
         try:
             res = (
                 self.client.table("time_slots")
                 .select("*")
                 .eq("id", slot_id)
+                .maybe_single()
                 .execute()
             )
-            return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"get_time_slot failed: {e}", exc_info=True)
+            logger.exception("get_time_slot failed: %s", e)
             return None
 
+        slot = res.data if res else None
+        if slot is not None:
+            request_cache.cache_set(key, slot)
+        return slot
+
+    async def aget_time_slot(self, slot_id: str) -> Optional[Dict[str, Any]]:
+        """get_time_slot on the async client (shares the per-request memo)"""
+        key = ("time_slot", slot_id)
+        slot = request_cache.cache_get(key)
+        if slot is not None:
+            return slot
+
+        try:
+            client = await SupabaseClient.get_async_client()
+            res = await (
+                client.table("time_slots")
+                .select("*")
+                .eq("id", slot_id)
+                .maybe_single()
+                .execute()
+            )
+        except Exception as e:
+            logger.exception("aget_time_slot failed: %s", e)
+            return None
+
+        slot = res.data if res else None
+        if slot is not None:
+            request_cache.cache_set(key, slot)
+        return slot
+
     def get_time_slots_by_date(self, date_obj: date) -> List[Dict[str, Any]]:
         """Get time slots for a specific date"""
+        key = date_obj.isoformat()
+        cached = self.slot_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
             res = (
                 self.client.table("time_slots")
                 .select("*")
-                .eq("date", date_obj.isoformat())
+                .eq("date", key)
                 .order("start_time")
                 .execute()
             )
-            return res.data or []
+            slots = res.data or []
+            self.slot_cache.set(key, slots)
+            return slots
         except Exception as e:
-            logger.error(f"get_time_slots_by_date failed: {e}", exc_info=True)
+            logger.exception("get_time_slots_by_date failed: %s", e)
             return []
 
-    def get_available_slots(self, date_obj: date) -> List[Dict[str, Any]]:
-        """Get available time slots for a date"""
+    def get_available_slots(self, date_obj: date, only_available: bool = False) -> List[Dict[str, Any]]:
+        """Slots of a date with their availability, computed by the time_slots_with_availability view"""
+        key = ("available", date_obj.isoformat(), only_available)
+        cached = self.slot_cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            query = (
+                self.client.table("time_slots_with_availability")
+                .select("*")
+                .eq("date", date_obj.isoformat())
+            )
+            if only_available:
+                query = query.gt("available_spots", 0)
+            res = query.order("start_time").execute()
+            slots = res.data or []
+            self.slot_cache.set(key, slots)
+            return slots
+        except Exception as e:
+            logger.warning("time_slots_with_availability view failed, computing locally: %s", e)
+
         try:
-            slots = self.get_time_slots_by_date(date_obj)
             available_slots = []
-            
-            for slot in slots:
+            for slot in self.get_time_slots_by_date(date_obj):
                 max_capacity = slot.get('max_capacity', settings.MAX_APPOINTMENTS_PER_SLOT)
                 current_bookings = slot.get('current_bookings', 0)
                 available_spots = max_capacity - current_bookings
                 
-                slot_info = {
+                if only_available and available_spots <= 0:
+                    continue
+                available_slots.append({
                     **slot,
                     'available_spots': available_spots,
                     'is_available': available_spots > 0
-                }
-                available_slots.append(slot_info)
+                })
             
             return available_slots
         except Exception as e:
-            logger.error(f"get_available_slots failed: {e}", exc_info=True)
+            logger.exception("get_available_slots failed: %s", e)
             return []
 
-    def increment_time_slot_bookings(self, slot_id: str) -> bool:
-        """Increment bookings count for a time slot"""
+    async def aget_available_slots(self, date_obj: date, only_available: bool = False) -> List[Dict[str, Any]]:
+        """get_available_slots on the async client, sharing its cache"""
+        key = ("available", date_obj.isoformat(), only_available)
+        cached = self.slot_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            slot = self.get_time_slot(slot_id)
-            if not slot:
-                return False
-            
-            new_count = slot.get('current_bookings', 0) + 1
-            res = (
-                self.client.table("time_slots")
-                .update({'current_bookings': new_count, 'updated_at': datetime.utcnow().isoformat()})
-                .eq("id", slot_id)
-                .execute()
+            client = await SupabaseClient.get_async_client()
+            query = (
+                client.table("time_slots_with_availability")
+                .select("*")
+                .eq("date", date_obj.isoformat())
             )
+            if only_available:
+                query = query.gt("available_spots", 0)
+            res = await query.order("start_time").execute()
+            slots = res.data or []
+            self.slot_cache.set(key, slots)
+            return slots
+        except Exception as e:
+            logger.warning("time_slots_with_availability view failed, computing locally: %s", e)
+
+        # Rare path (view missing): reuse the sync fallback off the event loop
+        return await asyncio.to_thread(self.get_available_slots, date_obj, only_available)
+
+    def _adjust_slot_bookings(self, slot_id: str, delta: int) -> bool:
+        """Add delta to a slot's bookings (never below 0) in one atomic UPDATE"""
+        # The request's memoized row no longer reflects current_bookings
+        request_cache.cache_pop(("time_slot", slot_id))
+        try:
+            res = self.client.rpc(
+                "adjust_slot_bookings",
+                {"p_slot_id": slot_id, "p_delta": delta}
+            ).execute()
+            if res.data:
+                self._evict_slots(res.data[0].get("date"))
             return bool(res.data)
         except Exception as e:
-            logger.error(f"increment_time_slot_bookings failed: {e}", exc_info=True)
-            return False
+            if not _is_missing_function(e):
+                # The UPDATE may have committed (e.g. timeout): let the caller roll back
+                logger.exception("adjust_slot_bookings RPC failed: %s", e)
+                return False
+            logger.warning("adjust_slot_bookings RPC missing, updating locally: %s", e)
 
-    def decrement_time_slot_bookings(self, slot_id: str) -> bool:
-        """Decrement bookings count for a time slot"""
+        # Fallback: read-modify-write (two requests, not atomic)
         try:
             slot = self.get_time_slot(slot_id)
             if not slot:
                 return False
             
-            new_count = max(0, slot.get('current_bookings', 0) - 1)
+            new_count = max(0, slot.get('current_bookings', 0) + delta)
             res = (
                 self.client.table("time_slots")
-                .update({'current_bookings': new_count, 'updated_at': datetime.utcnow().isoformat()})
+                .update(
+                    {'current_bookings': new_count, 'updated_at': datetime.utcnow().isoformat()},
+                    count=CountMethod.exact,
+                    returning=ReturnMethod.minimal
+                )
                 .eq("id", slot_id)
                 .execute()
             )
-            return bool(res.data)
+            request_cache.cache_pop(("time_slot", slot_id))
+            self._evict_slots(slot.get("date"))
+            return bool(res.count)
         except Exception as e:
-            logger.error(f"decrement_time_slot_bookings failed: {e}", exc_info=True)
+            logger.exception("adjust_slot_bookings failed: %s", e)
             return False
 
+    def increment_time_slot_bookings(self, slot_id: str) -> bool:
+        """Increment bookings count for a time slot"""
+        return self._adjust_slot_bookings(slot_id, 1)
+
+    def decrement_time_slot_bookings(self, slot_id: str) -> bool:
+        """Decrement bookings count for a time slot"""
+        return self._adjust_slot_bookings(slot_id, -1)
+
+    @staticmethod
+    def _build_time_slots(date_obj: date, duration_minutes: int, now_iso: str) -> List[Dict[str, Any]]:
+        """Rows for every slot of the working day (no database call)"""
+        current_time = datetime.combine(date_obj, _WORKING_START)
+        end_time = datetime.combine(date_obj, _WORKING_END)
+        step = timedelta(minutes=duration_minutes)
+        day = date_obj.isoformat()
+        
+        slots = []
+        while current_time + step <= end_time:
+            slot_end = current_time + step
+            slots.append({
+                'date': day,
+                'start_time': current_time.strftime('%H:%M'),
+                'end_time': slot_end.strftime('%H:%M'),
+                'max_capacity': _MAX_CAPACITY,
+                'current_bookings': 0,
+                'created_at': now_iso,
+                'updated_at': now_iso
+            })
+            current_time = slot_end
+        
+        return slots
+
+    def _insert_time_slots(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert many slots in one request and evict their dates from the cache"""
+        if not rows:
+            return []
+        res = self.client.table("time_slots").insert(rows).execute()
+        for day in {row['date'] for row in rows}:
+            self._evict_slots(day)
+        return res.data or []
+
     def generate_time_slots_for_date(
         self,
         date_obj: date,
@@ -479,42 +1085,52 @@ class DatabaseManager:
             # Check if slots already exist for this date
             existing_slots = self.get_time_slots_by_date(date_obj)
             if existing_slots:
-                logger.info(f"Time slots already exist for {date_obj}")
+                logger.info("Time slots already exist for %s", date_obj)
                 return existing_slots
             
-            # Parse working hours
-            start_hour, start_minute = map(int, settings.WORKING_HOURS_START.split(':'))
-            end_hour, end_minute = map(int, settings.WORKING_HOURS_END.split(':'))
+            rows = self._build_time_slots(date_obj, duration_minutes, datetime.utcnow().isoformat())
+            slots = self._insert_time_slots(rows)
             
-            current_time = datetime.combine(date_obj, time(start_hour, start_minute))
-            end_time = datetime.combine(date_obj, time(end_hour, end_minute))
+            logger.info("Generated %s time slots for %s", len(slots), date_obj)
+            return slots
             
-            slots = []
-            while current_time < end_time:
-                slot_end = current_time + timedelta(minutes=duration_minutes)
-                
-                if slot_end <= end_time:
-                    slot_data = {
-                        'date': date_obj.isoformat(),
-                        'start_time': current_time.strftime('%H:%M'),
-                        'end_time': slot_end.strftime('%H:%M'),
-                        'max_capacity': settings.MAX_APPOINTMENTS_PER_SLOT,
-                        'current_bookings': 0,
-                        'created_at': datetime.utcnow().isoformat(),
-                        'updated_at': datetime.utcnow().isoformat()
-                    }
-                    
-                    created_slot = self.create_time_slot(slot_data)
-                    if created_slot:
-                        slots.append(created_slot)
-                
-                current_time = slot_end
+        except Exception as e:
+            logger.exception("generate_time_slots_for_date failed: %s", e)
+            return []
+
+    def generate_time_slots_for_range(
+        self,
+        start_date: date,
+        end_date: date,
+        duration_minutes: int = 60
+    ) -> List[Dict[str, Any]]:
+        """Generate time slots for every date of a range that has none, in one insert (returns the new slots)"""
+        try:
+            existing_dates = {
+                slot['date'] for slot in self._select_all(
+                    lambda: self.client.table("time_slots")
+                    .select("date")
+                    .gte("date", start_date.isoformat())
+                    .lte("date", end_date.isoformat())
+                    .order("date")
+                    .order("id")
+                )
+            }
             
-            logger.info(f"Generated {len(slots)} time slots for {date_obj}")
+            now_iso = datetime.utcnow().isoformat()
+            rows = []
+            for i in range((end_date - start_date).days + 1):
+                day = start_date + timedelta(days=i)
+                if day.isoformat() not in existing_dates:
+                    rows.extend(self._build_time_slots(day, duration_minutes, now_iso))
+            
+            slots = self._insert_time_slots(rows)
+            
+            logger.info("Generated %s time slots from %s to %s", len(slots), start_date, end_date)
             return slots
             
         except Exception as e:
-            logger.error(f"generate_time_slots_for_date failed: {e}", exc_info=True)
+            logger.exception("generate_time_slots_for_range failed: %s", e)
             return []
 
     # ==================
@@ -525,11 +1141,22 @@ class DatabaseManager:
         """Create new appointment"""
         try:
             res = self.client.table("appointments").insert(data).execute()
+            self._invalidate_dashboard("stats")
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"create_appointment failed: {e}", exc_info=True)
+            logger.exception("create_appointment failed: %s", e)
             return None
 
+    def bulk_create_appointments(self, items: List[Dict[str, Any]]) -> int:
+        """Create many appointments in chunked multi-row INSERTs (admin importer)
+
+        Slot bookings are not adjusted: meant for importing past or already
+        counted appointments.
+        """
+        inserted = self._bulk_insert("appointments", items)
+        self._invalidate_dashboard("stats")
+        return inserted
+
     def get_appointment(self, appointment_id: str) -> Optional[Dict[str, Any]]:
         """Get appointment by ID"""
         try:
@@ -537,37 +1164,52 @@ class DatabaseManager:
                 self.client.table("appointments")
                 .select("*")
                 .eq("id", appointment_id)
+                .maybe_single()
                 .execute()
             )
-            return res.data[0] if res.data else None
+            return res.data if res else None
+        except Exception as e:
+            logger.exception("get_appointment failed: %s", e)
+            return None
+
+    def get_appointment_with_slot(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        """Get appointment by ID with its time slot embedded under 'time_slot'"""
+        try:
+            res = (
+                self.client.table("appointments")
+                .select("*, time_slot:time_slots(*)")
+                .eq("id", appointment_id)
+                .maybe_single()
+                .execute()
+            )
+            return res.data if res else None
         except Exception as e:
-            logger.error(f"get_appointment failed: {e}", exc_info=True)
+            logger.exception("get_appointment_with_slot failed: %s", e)
             return None
 
     def get_appointments(
         self,
         filters: Optional[Dict[str, Any]] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        columns: str = "*",
+        after: Optional[Tuple[str, str]] = None
     ) -> List[Dict[str, Any]]:
-        """Get appointments with optional filters"""
+        """Get appointments with optional filters (keyset-paged past `after` when given)
+
+        Index-covered filters: status (see README, Index).
+        """
+        filters = _non_null(filters)
         try:
-            query = self.client.table("appointments").select("*")
+            query = self.client.table("appointments").select(columns)
 
             if filters:
-                for k, v in filters.items():
-                    if v is not None:
-                        query = query.eq(k, v)
+                query = query.match(filters)
 
-            res = (
-                query.order("created_at", desc=True)
-                .limit(limit)
-                .offset(offset)
-                .execute()
-            )
+            res = _keyset_page(query, limit, offset, after).execute()
             return res.data or []
         except Exception as e:
-            logger.error(f"get_appointments failed: {e}", exc_info=True)
+            logger.exception("get_appointments failed: %s", e)
             return []
 
     def update_appointment(self, appointment_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -580,71 +1222,315 @@ class DatabaseManager:
                 .eq("id", appointment_id)
                 .execute()
             )
+            self._invalidate_dashboard("stats")
             return res.data[0] if res.data else None
         except Exception as e:
-            logger.error(f"update_appointment failed: {e}", exc_info=True)
+            logger.exception("update_appointment failed: %s", e)
             return None
 
+    async def get_appointments_between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        """Appointments still awaiting a reminder whose slot falls between two dates (inclusive)"""
+        try:
+            client = await SupabaseClient.get_async_client()
+            res = await (
+                client.table("appointments")
+                .select("*, time_slot:time_slots!inner(date, start_time)")
+                .eq("reminder_sent", False)
+                .neq("status", "cancelled")
+                .gte("time_slot.date", start.isoformat())
+                .lte("time_slot.date", end.isoformat())
+                .execute()
+            )
+            return res.data or []
+        except Exception as e:
+            logger.exception("get_appointments_between failed: %s", e)
+            return []
+
+    async def get_upcoming_reminder_slots(self, from_date: date, limit: int = 10) -> List[Dict[str, Any]]:
+        """Earliest slots from a date on that still have an appointment awaiting its reminder"""
+        try:
+            client = await SupabaseClient.get_async_client()
+            res = await (
+                client.table("time_slots")
+                .select("date, start_time, appointments!inner(id)")
+                .eq("appointments.reminder_sent", False)
+                .neq("appointments.status", "cancelled")
+                .gte("date", from_date.isoformat())
+                .order("date")
+                .order("start_time")
+                .limit(limit)
+                .execute()
+            )
+            return res.data or []
+        except Exception as e:
+            logger.exception("get_upcoming_reminder_slots failed: %s", e)
+            return []
+
+    async def mark_reminders_sent(self, appointment_ids: List[str]) -> int:
+        """Flag reminders as sent for several appointments in one UPDATE"""
+        if not appointment_ids:
+            return 0
+        try:
+            client = await SupabaseClient.get_async_client()
+            res = await (
+                client.table("appointments")
+                .update({
+                    "reminder_sent": True,
+                    "updated_at": datetime.utcnow().isoformat()
+                })
+                .in_("id", appointment_ids)
+                .execute()
+            )
+            return len(res.data or [])
+        except Exception as e:
+            logger.exception("mark_reminders_sent failed: %s", e)
+            return 0
+
     def delete_appointment(self, appointment_id: str) -> bool:
         """Delete appointment"""
         try:
             res = (
                 self.client.table("appointments")
-                .delete()
+                .delete(count=CountMethod.exact, returning=ReturnMethod.minimal)
                 .eq("id", appointment_id)
                 .execute()
             )
-            return bool(res.data)
+            self._invalidate_dashboard("stats")
+            return bool(res.count)
         except Exception as e:
-            logger.error(f"delete_appointment failed: {e}", exc_info=True)
+            logger.exception("delete_appointment failed: %s", e)
             return False
 
+    # ==================
+    # EXPORT
+    # ==================
+
+    @staticmethod
+    def _pages(make_query: Callable[[], Any], page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield the rows of an ordered query page by page with .range(), so
+        PostgREST's max-rows cap (1000 by default) never truncates the result.
+        make_query builds a fresh query each time; errors propagate.
+        """
+        offset = 0
+        while True:
+            res = make_query().range(offset, offset + page_size - 1).execute()
+            rows = res.data or []
+            if rows:
+                yield rows
+
+            if len(rows) < page_size:
+                return
+            offset += page_size
+
+    def _select_all(self, make_query: Callable[[], Any]) -> List[Dict[str, Any]]:
+        """Every row of an ordered query, fetched in max-rows pages"""
+        return [row for rows in self._pages(make_query) for row in rows]
+
+    def iter_pages(self, table: str, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """Yield every row of a table, one page (list of rows) at a time
+
+        A failed page is logged and re-raised: a streamed backup must abort
+        rather than end normally with rows missing.
+        """
+        try:
+            yield from self._pages(
+                lambda: self.client.table(table).select("*").order("id"),
+                page_size
+            )
+        except Exception as e:
+            logger.exception("iter_pages(%s) failed: %s", table, e)
+            raise
+
     # ==================
     # STATISTICS
     # ==================
 
+    def _count_where(self, table: str, created_since: Optional[str] = None, **eq_filters: Any) -> int:
+        """Exact row count matching equality filters, without transferring any row"""
+        query = self.client.table(table).select("id", count=CountMethod.exact, head=True)
+        for column, value in eq_filters.items():
+            query = query.eq(column, value)
+        if created_since is not None:
+            query = query.gte("created_at", created_since)
+        return query.execute().count or 0
+
+    def _count_by_status(self, table: str, statuses: Tuple[str, ...], **extra: Any) -> Dict[str, int]:
+        """
+        Count-only fallback for the per-status RPCs: one HEAD request per known
+        status, plus 'other' for any remainder so totals stay exact.
+        """
+        counts = {status: self._count_where(table, status=status, **extra) for status in statuses}
+        other = self._count_where(table, **extra) - sum(counts.values())
+        if other > 0:
+            counts["other"] = other
+        return counts
+
     def get_stats(self) -> Dict[str, Any]:
-        """Get dashboard statistics"""
+        """Get dashboard statistics (counted in one query by the database)"""
         try:
-            # Get all orders
-            orders = self.get_orders(limit=10000)
-            messages = self.get_messages(limit=10000)
-            appointments = self.get_appointments(limit=10000)
-            
-            # Calculate order statistics
-            total_orders = len(orders)
-            pending_orders = sum(1 for o in orders if o.get('status') == 'pending')
-            completed_orders = sum(1 for o in orders if o.get('status') == 'completed')
-            cancelled_orders = sum(1 for o in orders if o.get('status') == 'cancelled')
-            total_revenue = sum(o.get('price', 0) for o in orders if o.get('status') == 'completed')
-            
-            # Calculate message statistics
-            total_messages = len(messages)
-            unread_messages = sum(1 for m in messages if m.get('status') == 'unread')
-            
-            # Calculate appointment statistics
-            total_appointments = len(appointments)
-            upcoming_appointments = sum(
-                1 for a in appointments 
-                if a.get('status') == 'confirmed'
-            )
-            
+            res = self.client.rpc("get_dashboard_stats").execute()
+            return res.data or {}
+        except Exception as e:
+            logger.warning("get_dashboard_stats RPC failed, counting per table: %s", e)
+
+        # Fallback: count-only requests, plus the per-status order aggregate
+        try:
+            orders = {row["status"]: row for row in self.get_orders_stats()}
             return {
-                'total_orders': total_orders,
-                'pending_orders': pending_orders,
-                'completed_orders': completed_orders,
-                'cancelled_orders': cancelled_orders,
-                'total_revenue': total_revenue,
-                'total_messages': total_messages,
-                'unread_messages': unread_messages,
-                'total_appointments': total_appointments,
-                'upcoming_appointments': upcoming_appointments
+                "total_orders": sum(row["count"] for row in orders.values()),
+                "pending_orders": orders.get("pending", {}).get("count", 0),
+                "completed_orders": orders.get("completed", {}).get("count", 0),
+                "cancelled_orders": orders.get("cancelled", {}).get("count", 0),
+                "total_revenue": orders.get("completed", {}).get("revenue", 0),
+                "total_messages": self._count_where("contact_messages"),
+                "unread_messages": self._count_where("contact_messages", status="unread"),
+                "total_appointments": self._count_where("appointments"),
+                "upcoming_appointments": self._count_where("appointments", status="confirmed"),
             }
-            
         except Exception as e:
-            logger.error(f"get_stats failed: {e}", exc_info=True)
+            logger.exception("get_stats failed: %s", e)
             return {}
 
+    def get_orders_stats(self) -> List[Dict[str, Any]]:
+        """Order count and revenue per status"""
+        try:
+            res = self.client.rpc("get_orders_stats").execute()
+            return res.data or []
+        except Exception as e:
+            logger.warning("get_orders_stats RPC failed, aggregating locally: %s", e)
+
+        try:
+            counts = self._count_by_status("orders", ORDER_STATUSES)
+            # Revenue needs the prices, but only of completed orders, paged past max-rows
+            revenue = sum(
+                row.get('price') or 0
+                for row in self._select_all(
+                    lambda: self.client.table("orders")
+                    .select("price")
+                    .eq("status", "completed")
+                    .order("id")
+                )
+            ) if counts.get("completed") else 0
+            return [
+                {"status": status, "count": count, "revenue": revenue if status == "completed" else 0}
+                for status, count in counts.items()
+                if count
+            ]
+        except Exception as e:
+            logger.exception("get_orders_stats failed: %s", e)
+            return []
+
+    def get_messages_stats(self) -> List[Dict[str, Any]]:
+        """Message count per status, with how many arrived today (UTC)"""
+        try:
+            res = self.client.rpc("get_messages_stats").execute()
+            return res.data or []
+        except Exception as e:
+            logger.warning("get_messages_stats RPC failed, aggregating locally: %s", e)
+
+        try:
+            counts = self._count_by_status("contact_messages", MESSAGE_STATUSES)
+            today = self._count_by_status(
+                "contact_messages",
+                MESSAGE_STATUSES,
+                created_since=datetime.utcnow().date().isoformat()
+            )
+            return [
+                {"status": status, "count": count, "today": today.get(status, 0)}
+                for status, count in counts.items()
+                if count
+            ]
+        except Exception as e:
+            logger.exception("get_messages_stats failed: %s", e)
+            return []
+
+    def get_revenue_buckets(self, start_date: datetime, bucket: str) -> List[Dict[str, Any]]:
+        """Completed-order revenue per day/week/month bucket since start_date"""
+        try:
+            res = self.client.rpc(
+                "get_revenue_buckets",
+                {"p_start": start_date.isoformat(), "p_bucket": bucket}
+            ).execute()
+            return res.data or []
+        except Exception as e:
+            logger.warning("get_revenue_buckets RPC failed, aggregating locally: %s", e)
+
+        return [
+            {"bucket": row["bucket"], "revenue": row["revenue"]}
+            for row in self._aggregate_orders(start_date, bucket)
+            if row["completed"]
+        ]
+
+    def get_orders_status_buckets(self, start_date: datetime, bucket: str) -> List[Dict[str, Any]]:
+        """Order counts per status and per day/week/month bucket since start_date"""
+        try:
+            res = self.client.rpc(
+                "get_orders_status_buckets",
+                {"p_start": start_date.isoformat(), "p_bucket": bucket}
+            ).execute()
+            return res.data or []
+        except Exception as e:
+            logger.warning("get_orders_status_buckets RPC failed, aggregating locally: %s", e)
+
+        return self._aggregate_orders(start_date, bucket)
+
+    def _aggregate_orders(self, start_date: datetime, bucket: str) -> List[Dict[str, Any]]:
+        """
+        Fallback for the bucket RPCs when they are not deployed: fetch only the
+        period's orders and the three needed columns, then bucket them in one pass.
+        """
+        try:
+            orders = self._select_all(
+                lambda: self.client.table("orders")
+                .select("created_at,status,price")
+                .gte("created_at", start_date.isoformat())
+                .order("id")
+            )
+
+            buckets: Dict[datetime, Dict[str, Any]] = {}
+            for order in orders:
+                key = _truncate(_parse_timestamp(order['created_at']), bucket)
+
+                row = buckets.get(key)
+                if row is None:
+                    row = buckets[key] = {"revenue": 0, "pending": 0, "completed": 0, "cancelled": 0}
+
+                order_status = order.get('status') or 'pending'
+                if order_status in row:
+                    row[order_status] += 1
+                if order_status == 'completed':
+                    row["revenue"] += order.get('price') or 0
+
+            return [
+                {"bucket": key.isoformat(), **row}
+                for key, row in sorted(buckets.items())
+            ]
+        except Exception as e:
+            logger.exception("_aggregate_orders failed: %s", e)
+            return []
+
+    def get_service_counts(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Number of orders per service, most ordered first"""
+        try:
+            res = self.client.rpc("get_service_counts", {"p_limit": limit}).execute()
+            return res.data or []
+        except Exception as e:
+            logger.warning("get_service_counts RPC failed, counting locally: %s", e)
+
+        try:
+            rows = self._select_all(
+                lambda: self.client.table("orders").select("service").order("id")
+            )
+            counts = Counter(row.get('service') or 'Unknown' for row in rows)
+            return [
+                {"service": service, "count": count}
+                for service, count in counts.most_common(limit)
+            ]
+        except Exception as e:
+            logger.exception("get_service_counts failed: %s", e)
+            return []
+
 
 # =========================
 # Global instance
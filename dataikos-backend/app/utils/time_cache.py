@@ -0,0 +1,16 @@
+import time
+from datetime import datetime
+
+# Maximum age of the cached timestamp, in seconds
+_REFRESH_INTERVAL = 0.1
+
+_last = (float("-inf"), "")
+
+
+def now_iso() -> str:
+    """Current UTC time in ISO format, recomputed at most every 100ms"""
+    global _last
+    t = time.monotonic()
+    if t - _last[0] > _REFRESH_INTERVAL:
+        _last = (t, datetime.utcnow().isoformat())
+    return _last[1]
@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+# supabase-py only checks that the key looks like a JWT
+_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test"
+
+# Settings are validated on import: placeholders for the required ones
+for _name, _value in {
+    "SECRET_KEY": "test-secret-key",
+    "SUPABASE_URL": "https://test.supabase.co",
+    "SUPABASE_KEY": _KEY,
+    "SUPABASE_SERVICE_ROLE_KEY": _KEY,
+    "ADMIN_USERNAME": "admin",
+    "ADMIN_PASSWORD": "admin",
+    "ADMIN_EMAIL": "admin@example.com",
+    "SMTP_USERNAME": "smtp",
+    "SMTP_PASSWORD": "smtp",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.utils.supabase_client import DatabaseManager, _non_null  # noqa: E402
+
+
+class FakeQuery:
+    """Chainable stand-in for a postgrest query builder, recording match() calls"""
+
+    def __init__(self):
+        self.matched = []
+
+    def match(self, filters):
+        self.matched.append(filters)
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": []})()
+
+    def __getattr__(self, name):
+        # select, order, limit, offset, gte...: keep chaining
+        return lambda *args, **kwargs: self
+
+
+class FakeClient:
+    def __init__(self):
+        self.query = FakeQuery()
+
+    def table(self, name):
+        return self.query
+
+
+@pytest.fixture
+def manager():
+    db = DatabaseManager.__new__(DatabaseManager)
+    db.client = FakeClient()
+    return db
+
+
+@pytest.mark.parametrize("filters", [None, {}, {"status": None}])
+def test_unset_filters_skip_match(manager, filters):
+    assert manager.get_orders(filters=filters) == []
+    assert manager.client.query.matched == []
+
+
+def test_set_filter_is_matched(manager):
+    manager.get_orders(filters={"status": "pending", "service": None})
+    assert manager.client.query.matched == [{"status": "pending"}]
+
+
+@pytest.mark.parametrize("filters, expected", [
+    (None, {}),
+    ({}, {}),
+    ({"status": None}, {}),
+    ({"status": "pending", "service": None}, {"status": "pending"}),
+])
+def test_non_null(filters, expected):
+    assert _non_null(filters) == expected
@@ -6,6 +6,7 @@ Vérifie que tous les fichiers nécessaires sont présents et correctement organ
 
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 # Couleurs pour le terminal
@@ -14,9 +15,19 @@ RED = '\033[91m'
 YELLOW = '\033[93m'
 RESET = '\033[0m'
 
+@lru_cache(maxsize=None)
+def _listing(directory):
+    """Noms présents dans un dossier (un seul scandir par dossier)"""
+    try:
+        with os.scandir(directory) as entries:
+            return frozenset(entry.name for entry in entries)
+    except OSError:
+        return frozenset()
+
 def check_file(filepath, required=True):
     """Vérifie qu'un fichier existe"""
-    if os.path.exists(filepath):
+    directory, name = os.path.split(filepath.rstrip("/"))
+    if name in _listing(directory or "."):
         print(f"{GREEN}✓{RESET} {filepath}")
         return True
     else:
@@ -80,10 +91,17 @@ def main():
     all_valid &= check_file("app/utils/security.py")
     all_valid &= check_file("app/utils/email_service.py")
     all_valid &= check_file("app/utils/scheduler.py")
+    all_valid &= check_file("app/utils/cache.py")
+    all_valid &= check_file("app/utils/time_cache.py")
+    all_valid &= check_file("app/utils/responses.py")
+    all_valid &= check_file("app/utils/body.py")
+    all_valid &= check_file("app/utils/pagination.py")
+    all_valid &= check_file("app/utils/request_cache.py")
     
     # Templates
     print("\n📧 Templates:")
-    all_valid &= check_file("app/templates/email", required=False)
+    all_valid &= check_file("app/templates/email/appointment_confirmation.html")
+    all_valid &= check_file("app/templates/email/appointment_reminder.html")
     
     # Dossiers
     print("\n📁 Dossiers:")